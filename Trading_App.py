@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import streamlit as st
 
 st.set_page_config(
@@ -9,7 +11,23 @@ st.set_page_config(
 st.markdown("<h1 style='text-align: center;'>Trading Guide App 📊</h1>", unsafe_allow_html=True)
 st.header("Your premier platform for comprehensive market insights before making investment decisions.")
 
-st.image("E:/CAPM Web Application/images/trading_app_img.png", use_container_width=True)
+## The banner is read relative to this file and converted once per process to a JPEG
+## at the widest size Streamlit serves (about 200 KB instead of 2 MB). With the format
+## given, st.image passes the cached bytes through instead of decoding them each rerun.
+
+@st.cache_resource
+def load_image(max_width = 1460):
+    import io
+    from PIL import Image
+
+    image = Image.open(Path(__file__).parent / "images/trading_app_img.png").convert("RGB")
+    if image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format = "JPEG", quality = 90)
+    return buffer.getvalue()
+
+st.image(load_image(), output_format = "JPEG", width="stretch")
 
 # Services introduction
 st.markdown("# Our Core Services:")
@@ -0,0 +1,157 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.align as align
+import utils.backtest as backtest
+import utils.functions as fn
+import utils.regression as reg
+import utils.results_view as results_view
+
+## Benchmarks for the returns, beta, backtest, alignment and plotting hot paths.
+## Everything runs on synthetic price panels, so no network access is needed.
+##
+##   python benchmarks/run_benchmarks.py --output bench.json
+##   python benchmarks/run_benchmarks.py --quick --compare bench.json
+
+FULL_TICKERS = [1, 10, 100, 1000, 5000]
+FULL_YEARS = [1, 5, 25]
+QUICK_TICKERS = [1, 10, 100]
+QUICK_YEARS = [1, 5]
+
+
+## Synthetic panel: prices indexed by tz-aware dates plus a benchmark with holiday gaps
+
+def synthetic_panel(tickers, years, seed = 0):
+    rng = np.random.default_rng(seed)
+    days = 252 * years
+    dates = pd.bdate_range(end = '2025-01-01', periods = days, tz = 'America/New_York')
+
+    market = rng.normal(0.0003, 0.01, days)
+    betas = rng.uniform(0.3, 2.0, tickers)
+    noise = rng.normal(0, 0.015, (days, tickers))
+    prices = 100 * np.exp(np.cumsum(market[:, None] * betas + noise, axis = 0))
+
+    prices = pd.DataFrame(prices, index = dates, columns = [f"T{i:04d}" for i in range(tickers)])
+    benchmark = pd.Series(1000 * np.exp(np.cumsum(market)), index = dates.tz_localize(None), name = 'SP500')
+    benchmark.iloc[::60] = np.nan
+    return prices, benchmark
+
+
+## Best-of-N wall time and peak traced memory of one call
+
+def measure(func, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run(tickers_list, years_list, repeat, max_plot_tickers):
+    results = []
+    for years in years_list:
+        for tickers in tickers_list:
+            prices, benchmark = synthetic_panel(tickers, years)
+            stocks_df, _ = align.align_to_benchmark(prices, benchmark)
+            returns = fn.daily_returns(stocks_df)
+            table = reg.regress_on_market(returns).round(4)
+
+            cases = {
+                'align_to_benchmark': lambda: align.align_to_benchmark(prices, benchmark),
+                'daily_returns': lambda: fn.daily_returns(stocks_df),
+                'normalize_prices': lambda: fn.normalize_prices(stocks_df),
+                'calculate_beta': lambda: fn.calculate_beta(returns, returns.columns[1]),
+                'regress_on_market': lambda: reg.regress_on_market(returns),
+                'rolling_beta_252': lambda: reg.rolling_beta(returns, 252),
+                'walk_forward_monthly': lambda: backtest.error_stats(backtest.walk_forward(returns)),
+                'results_query': lambda: results_view.query(table.reset_index(), 'beta', page_size = 50),
+                'results_export': lambda: results_view.export(table.reset_index()),
+            }
+            if tickers <= max_plot_tickers:
+                cases['plot_capm_return'] = lambda: fn.plot_capm_return(stocks_df).to_json()
+
+            for name, func in cases.items():
+                seconds, peak = measure(func, repeat)
+                results.append({
+                    'benchmark': name, 'tickers': tickers, 'years': years,
+                    'seconds': seconds, 'peak_bytes': peak,
+                })
+                print(f"{name:<20} tickers={tickers:<5} years={years:<3} "
+                      f"{seconds * 1000:10.3f} ms {peak / 1e6:10.2f} MB", file = sys.stderr)
+    return results
+
+
+## Compare against a previous run, returning the cases that got slower than allowed
+
+def regressions(results, baseline, tolerance):
+    previous = {(r['benchmark'], r['tickers'], r['years']): r for r in baseline['results']}
+    slower = []
+    for r in results:
+        old = previous.get((r['benchmark'], r['tickers'], r['years']))
+        if old and r['seconds'] > old['seconds'] * (1 + tolerance):
+            slower.append({**r, 'baseline_seconds': old['seconds']})
+    return slower
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the CAPM hot paths on synthetic data.")
+    parser.add_argument('--quick', action = 'store_true', help = "small panels only")
+    parser.add_argument('--tickers', type = int, nargs = '+', help = "ticker counts to run")
+    parser.add_argument('--years', type = int, nargs = '+', help = "history lengths in years")
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--max-plot-tickers', type = int, default = 50, help = "skip plot_capm_return above this size")
+    parser.add_argument('--output', help = "write results as JSON to this file (default stdout)")
+    parser.add_argument('--compare', help = "baseline JSON from a previous run")
+    parser.add_argument('--tolerance', type = float, default = 0.25, help = "allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    tickers_list = args.tickers or (QUICK_TICKERS if args.quick else FULL_TICKERS)
+    years_list = args.years or (QUICK_YEARS if args.quick else FULL_YEARS)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': run(tickers_list, years_list, args.repeat, args.max_plot_tickers),
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = regressions(report['results'], json.load(f), args.tolerance)
+        for r in report['regressions']:
+            print(f"REGRESSION {r['benchmark']} tickers={r['tickers']} years={r['years']}: "
+                  f"{r['baseline_seconds'] * 1000:.3f} ms -> {r['seconds'] * 1000:.3f} ms", file = sys.stderr)
+        status = 1 if report['regressions'] else 0
+
+    output = json.dumps(report, indent = 2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,10 @@
 ## CAPM Beta Analysis Page
 
-import datetime
-import numpy as np
-import pandas as pd
-import pandas_datareader.data as web
 import streamlit as st
-import yfinance as yf
-import utils.functions as fn
+import utils.risk_free as risk_free
+import utils.snapshot as snapshot
+import utils.symbols as symbols
+import utils.tracing as tracing
 
 ## Page configuration
 st.set_page_config(
@@ -15,30 +13,84 @@ st.set_page_config(
     layout="wide"
 )
 
-## Initialize session state for beta analysis
-if 'beta_data' not in st.session_state:
-    st.session_state.beta_data = {}
-
 ## Title
 st.markdown("<h1 style='text-align: center;'>🔍 CAPM Beta Analysis</h1>", unsafe_allow_html=True)
 
+## Sample figure for the landing state, built once per process
+
+@st.cache_resource
+def sample_figure():
+    import plotly.graph_objects as go
+    
+    sample_fig = go.Figure()
+    sample_fig.add_trace(go.Scatter(
+        x=[-2, -1, 0, 1, 2],
+        y=[-1.5, -0.8, 0, 0.9, 2.1],
+        mode='markers',
+        name='Stock Returns',
+        marker=dict(color='blue', size=8, opacity=0.6)
+    ))
+    sample_fig.add_trace(go.Scatter(
+        x=[-2, 2],
+        y=[-1.6, 2.0],
+        mode='lines',
+        name='Expected Return (β=0.9)',
+        line=dict(color='red', width=2)
+    ))
+    sample_fig.update_layout(
+        title="Sample Beta Analysis",
+        xaxis_title="Market Returns (%)",
+        yaxis_title="Stock Returns (%)",
+        height=400,
+        showlegend=True
+    )
+    return sample_fig
+
+## Headline results, from the nightly snapshot or the live analysis
+
+def show_key_results(stock, beta_value, capm_return, alpha_value):
+    st.markdown("---")
+    st.markdown(f"<h2 style='text-align: center;'>📊 Analysis Results for {stock}</h2>", unsafe_allow_html=True)
+    
+    empty_col1, result_col1, result_col2, result_col3, empty_col2 = st.columns([5, 2, 2, 2, 5])
+    
+    with result_col1:
+        st.metric("Beta (β)", f"{beta_value:.4f}")
+    with result_col2:
+        st.metric("Expected Return", f"{capm_return:.2f}%")
+    with result_col3:
+        st.metric("Alpha (α)", f"{alpha_value:.4f}")
+
 ## Main content area - User inputs section
 
 ## Create columns for inputs
-input_col1, input_col2 = st.columns([1, 1])
+input_col1, input_col2, input_col3 = st.columns([1, 1, 1])
 
 with input_col1:
+    # Search the symbol master, the dropdown lists the matches
+    symbol_index = symbols.get_index()
+    query = st.text_input("Search symbols:", placeholder="Ticker or company name, e.g. NVDA or Nvidia")
+    current = st.session_state.get("single_stock")
+    matches = symbol_index.search(query) if query else symbols.DEFAULT_SYMBOLS
+    
     # Stock selection - no default selection
     single_stock = st.selectbox(
         "Choose a stock:",
-        ["Select a stock..."] + ["AAPL", "GOOGL", "MSFT", "NFLX", "AMZN", "TSLA", "META", "NVDA", "JPM", "MGM"],
-        index=0  # Default to "Select a stock..."
+        list(dict.fromkeys(["Select a stock..."] + ([current] if current else []) + matches)),
+        index=0,  # Default to "Select a stock..."
+        format_func=lambda symbol: symbol if symbol == "Select a stock..." else symbol_index.label(symbol),
+        accept_new_options=True,
+        key="single_stock"
     )
 
 with input_col2:
     # Years selection
     years = st.number_input("Number of Years", min_value=1, max_value=25, value=1, step=1)
 
+with input_col3:
+    # Risk-free rate used for the excess-return regression
+    rf_source = st.selectbox("Risk-free rate:", list(risk_free.SOURCES), format_func=risk_free.SOURCES.get)
+
 ## Check if a valid stock is selected
 if single_stock == "Select a stock...":
     ## Display initial message when no stock is selected
@@ -75,215 +127,192 @@ if single_stock == "Select a stock...":
     ## Sample visualization placeholder
     st.markdown("### 📊 Sample Analysis Preview:")
     
-    # Create a sample plot to show what users can expect
-    import plotly.graph_objects as go
-    
-    sample_fig = go.Figure()
-    sample_fig.add_trace(go.Scatter(
-        x=[-2, -1, 0, 1, 2],
-        y=[-1.5, -0.8, 0, 0.9, 2.1],
-        mode='markers',
-        name='Stock Returns',
-        marker=dict(color='blue', size=8, opacity=0.6)
-    ))
-    sample_fig.add_trace(go.Scatter(
-        x=[-2, 2],
-        y=[-1.6, 2.0],
-        mode='lines',
-        name='Expected Return (β=0.9)',
-        line=dict(color='red', width=2)
-    ))
-    sample_fig.update_layout(
-        title="Sample Beta Analysis",
-        xaxis_title="Market Returns (%)",
-        yaxis_title="Stock Returns (%)",
-        height=400,
-        showlegend=True
-    )
-    
-    st.plotly_chart(sample_fig, use_container_width=True)
+    st.plotly_chart(sample_figure(), width="stretch")
+
+elif not symbols.is_ticker(single_stock):
+    ## Validate typed symbols before anything is downloaded
+    st.markdown("---")
+    st.warning(f"⚠️ **{single_stock}** is not a valid ticker symbol. Search by ticker or company name above.")
 
 else:
-    ## Create unique key for current beta selection
-    beta_selection = f"{single_stock}_{years}"
+    single_stock = single_stock.strip().upper()
     
-    ## Check if we need new data or use cached data
-    need_new_beta_data = (
-        'current_beta_selection' not in st.session_state or 
-        st.session_state.current_beta_selection != beta_selection or
-        beta_selection not in st.session_state.beta_data
-    )
+    ## Common requests are answered from the nightly snapshot, without fetching or regressing;
+    ## the full analysis only runs once the detailed views are opened
+    quick = snapshot.get_snapshot().lookup(single_stock, years, rf_source)
+    if quick is not None:
+        show_key_results(single_stock, quick['beta'], quick['capm_return'], quick['alpha'])
+        st.caption(f"As of the nightly snapshot of {quick['end']:%b %d, %Y}.")
+    details = quick is None or st.toggle("Show detailed analysis", help="Loads the latest prices for factor exposures, error bands and charts.")
+    
+    if details:
+        ## Analysis modules pull in pandas and Plotly, the landing state does without them
+        import numpy as np
+        import pandas as pd
+        import utils.analysis as an
+        import utils.functions as fn
+        import utils.regression as reg
     
-    ## Main analysis when a stock is selected
-    try:
-        if need_new_beta_data:
+        ## Optional timing of this run (CAPM_TRACE=1 or ?debug=1)
+        trace = tracing.begin("CAPM_beta", tracing.ENABLED or st.query_params.get("debug") == "1")
+    
+        ## Main analysis when a stock is selected
+        try:
+            ## Shared across sessions; a new trading day only folds in the new bars
             with st.spinner(f"Fetching data for {single_stock}..."):
-                # Get data
-                dt = datetime.date
-                end = dt.today()
-                start = dt(dt.today().year - years, end.month, end.day)
-                
-                SP500 = web.DataReader(['SP500'], 'fred', start, end)
-                stock_data = yf.download(single_stock, period=f'{years}y', auto_adjust=True)
-                
-                # Prepare dataframe
-                stock_df = pd.DataFrame()
-                stock_df['Date'] = stock_data.index
-                stock_df[single_stock] = stock_data['Close'].values
-                
-                SP500.reset_index(inplace=True)
-                SP500.columns = ['Date', 'SP500']
-                stock_df.reset_index(drop=True, inplace=True)
-                stock_df['Date'] = pd.to_datetime(stock_df['Date'])
-                stock_df = pd.merge(stock_df, SP500, on='Date', how='inner')
-                
-                # Calculate returns and beta
-                stock_returns = fn.daily_returns(stock_df.copy())
-                beta_value, alpha_value = fn.calculate_beta(stock_returns, single_stock)
-                
-                # Calculate CAPM return
-                rf = 0
-                rm = stock_returns['SP500'].mean() * 252
-                capm_return = rf + (beta_value * (rm - rf))
-                
-                # Calculate additional statistics
-                y_pred = alpha_value + beta_value * stock_returns['SP500']
-                ss_res = np.sum((stock_returns[single_stock] - y_pred) ** 2)
-                ss_tot = np.sum((stock_returns[single_stock] - np.mean(stock_returns[single_stock])) ** 2)
-                r_squared = 1 - (ss_res / ss_tot)
-                correlation = np.corrcoef(stock_returns['SP500'], stock_returns[single_stock])[0,1]
-                volatility = np.std(stock_returns[single_stock])
-                
-                ## Store in session state
-                st.session_state.beta_data[beta_selection] = {
-                    'stock_returns': stock_returns,
-                    'beta_value': beta_value,
-                    'alpha_value': alpha_value,
-                    'capm_return': capm_return,
-                    'rf': rf,
-                    'rm': rm,
-                    'r_squared': r_squared,
-                    'correlation': correlation,
-                    'volatility': volatility,
-                    'single_stock': single_stock,
-                    'years': years
-                }
-                
-                st.session_state.current_beta_selection = beta_selection
+                beta_data = an.get_beta_analysis(single_stock, years, rf_source=rf_source)
         
-        ## Get data from session state
-        beta_data = st.session_state.beta_data[beta_selection]
-        stock_returns = beta_data['stock_returns']
-        beta_value = beta_data['beta_value']
-        alpha_value = beta_data['alpha_value']
-        capm_return = beta_data['capm_return']
-        rf = beta_data['rf']
-        rm = beta_data['rm']
-        r_squared = beta_data['r_squared']
-        correlation = beta_data['correlation']
-        volatility = beta_data['volatility']
+            ## Unpack the analysis
+            stock_returns = beta_data['stock_returns']
+            beta_value = beta_data['beta_value']
+            alpha_value = beta_data['alpha_value']
+            capm_return = beta_data['capm_return']
+            rf = beta_data['rf']
+            rm = beta_data['rm']
+            r_squared = beta_data['r_squared']
+            correlation = beta_data['correlation']
+            volatility = beta_data['volatility']
+            residual_volatility = beta_data['residual_volatility']
+            errors = beta_data['uncertainty']
+            factor_fits = beta_data['factor_fits']
         
-        ## Display Results Section
-        st.markdown("---")
-        #st.header(f"📊 Analysis Results for {single_stock}")
-        st.markdown(f"<h2 style='text-align: center;'>📊 Analysis Results for {single_stock}</h2>", unsafe_allow_html=True)
+            ## Display Results Section, key results at the top
+            if quick is None:
+                show_key_results(single_stock, beta_value, capm_return, alpha_value)
         
-        ## Key Results at the top
-        empty_col1, result_col1, result_col2, result_col3, empty_col2 = st.columns([5, 2, 2, 2, 5])
+            ## Multi-factor exposures next to the CAPM beta
+            st.markdown("### 🧮 Multi-Factor Exposures")
+            if not factor_fits:
+                st.info("Add the Fama-French daily factor CSVs to `data/factors` (or `CAPM_FACTORS_DIR`) to see factor loadings.")
+            else:
+                factor_col1, factor_col2 = st.columns([1, 1])
+                with factor_col1:
+                    factor_model = st.selectbox("Factor model:", list(factor_fits), index=len(factor_fits) - 1)
+                    fit = factor_fits[factor_model]
+                    st.dataframe(fit.table(single_stock), width="stretch", column_config={
+                        "Loading": st.column_config.NumberColumn(format="%.4f"),
+                        "t-stat": st.column_config.NumberColumn(format="%.2f"),
+                    })
+                with factor_col2:
+                    st.metric("Market Loading vs CAPM Beta", f"{fit.loadings.loc[single_stock, 'Mkt-RF']:.4f}",
+                              f"{fit.loadings.loc[single_stock, 'Mkt-RF'] - beta_value:+.4f} vs β", delta_color="off")
+                    st.metric("Factor-Implied Return", f"{fit.implied_return[single_stock]:.2f}%",
+                              f"{fit.implied_return[single_stock] - capm_return:+.2f}% vs CAPM", delta_color="off")
+                    st.metric("R-squared", f"{fit.r_squared[single_stock]:.4f}",
+                              f"{fit.r_squared[single_stock] - r_squared:+.4f} vs CAPM", delta_color="off")
+                    st.caption("Loadings with |t-stat| above 2 are significant at about the 5% level.")
         
-        with result_col1:
-            st.metric("Beta (β)", f"{beta_value:.4f}")
-        with result_col2:
-            st.metric("Expected Return", f"{capm_return:.2f}%")
-        with result_col3:
-            st.metric("Alpha (α)", f"{alpha_value:.4f}")
+            st.markdown("---")
         
-        st.markdown("---")
+            ## Main analysis layout
+            analysis_col1, analysis_col2 = st.columns([1, 1])
         
-        ## Main analysis layout
-        analysis_col1, analysis_col2 = st.columns([1, 1])
-        
-        with analysis_col1:
-            ## Detailed Analysis
-            st.markdown("<h3 style='text-align: center;'>📈 Detailed Analysis</h3>", unsafe_allow_html=True)
+            with analysis_col1:
+                ## Detailed Analysis
+                st.markdown("<h3 style='text-align: center;'>📈 Detailed Analysis</h3>", unsafe_allow_html=True)
             
-            # CAPM Formula
-            st.markdown("### 📌 CAPM Formula")
-            st.latex(r"E(R_i) = R_f + \beta_i (E(R_m) - R_f)")
+                # CAPM Formula
+                st.markdown("### 📌 CAPM Formula")
+                st.latex(r"E(R_i) = R_f + \beta_i (E(R_m) - R_f)")
             
-            # Parameters breakdown
-            st.markdown("### 📊 Parameters Used")
-            param_data = {
-                "Parameter": ["Risk-free Rate (Rf)", "Market Return (Rm)", "Beta (β)", "Alpha (α)"],
-                "Value": [f"{rf:.2f}%", f"{rm:.2f}%", f"{beta_value:.4f}", f"{alpha_value:.4f}"]
-            }
-            param_df = pd.DataFrame(param_data)
-            st.dataframe(param_df, use_container_width=True)
+                # Parameters breakdown
+                st.markdown("### 📊 Parameters Used")
+                param_data = {
+                    "Parameter": ["Risk-free Rate (Rf)", "Market Return (Rm)", "Beta (β)", "Alpha (α)"],
+                    "Value": [f"{rf:.2f}%", f"{rm:.2f}%", f"{beta_value:.4f}", f"{alpha_value:.4f}"]
+                }
+                param_df = pd.DataFrame(param_data)
+                st.dataframe(param_df, width="stretch")
+            
+                # Rolling beta over the selected windows
+                st.markdown("### 📉 Rolling Beta")
+                windows = st.multiselect("Rolling windows (trading days)", [60, 126, 252], default=[60, 252])
+                rolling_df = pd.DataFrame({
+                    f"{window}d": reg.rolling_beta(stock_returns, window)[single_stock] for window in windows
+                })
+                if not rolling_df.empty:
+                    with tracing.span("render.rolling_beta"):
+                        st.plotly_chart(fn.plot_rolling_beta(rolling_df), width="stretch")
             
             
         
-        with analysis_col2:
-            ## Regression Plot
-            st.markdown(f"<h3 style='text-align: center;'>📈 {single_stock} vs S&P500 Regression</h3>", unsafe_allow_html=True)
+            with analysis_col2:
+                ## Regression Plot
+                st.markdown(f"<h3 style='text-align: center;'>📈 {single_stock} vs S&P500 Regression</h3>", unsafe_allow_html=True)
             
-            # Create the regression plot
-            fig = fn.plot_beta_regression_detailed(stock_returns, single_stock, beta_value, alpha_value)
-            st.plotly_chart(fig, use_container_width=True)
+                # Create the regression plot
+                with tracing.span("render.regression"):
+                    fig = fn.plot_beta_regression_detailed(stock_returns, single_stock, beta_value, alpha_value)
+                    st.plotly_chart(fig, width="stretch")
         
-        # Risk Assessment
-        st.markdown("### 🎯 Risk Assessment")
-        if beta_value > 1:
-            st.error(f"🔴 **High Risk Stock**: {single_stock} is {abs(beta_value-1)*100:.1f}% more volatile than the market")
-            risk_interpretation = "This stock tends to amplify market movements - higher potential returns but also higher risk."
-        elif beta_value < 1:
-            st.success(f"🟢 **Low Risk Stock**: {single_stock} is {abs(1-beta_value)*100:.1f}% less volatile than the market")
-            risk_interpretation = "This stock is more stable than the market - lower risk but potentially lower returns."
-        else:
-            st.info(f"🟡 **Market Risk**: {single_stock} moves exactly with the market")
-            risk_interpretation = "This stock follows market movements closely."
+            # Risk Assessment
+            st.markdown("### 🎯 Risk Assessment")
+            if beta_value > 1:
+                st.error(f"🔴 **High Risk Stock**: {single_stock} is {abs(beta_value-1)*100:.1f}% more volatile than the market")
+                risk_interpretation = "This stock tends to amplify market movements - higher potential returns but also higher risk."
+            elif beta_value < 1:
+                st.success(f"🟢 **Low Risk Stock**: {single_stock} is {abs(1-beta_value)*100:.1f}% less volatile than the market")
+                risk_interpretation = "This stock is more stable than the market - lower risk but potentially lower returns."
+            else:
+                st.info(f"🟡 **Market Risk**: {single_stock} moves exactly with the market")
+                risk_interpretation = "This stock follows market movements closely."
         
-        st.write(risk_interpretation)
+            st.write(risk_interpretation)
         
-        ## Additional Statistics Section
-        st.markdown("---")
-        st.subheader("📊 Statistical Summary")
+            ## Additional Statistics Section
+            st.markdown("---")
+            st.subheader("📊 Statistical Summary")
         
-        stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
+            stats_col1, stats_col2, stats_col3, stats_col4 = st.columns(4)
         
-        with stats_col1:
-            st.metric("R-squared", f"{r_squared:.4f}")
-        with stats_col2:
-            st.metric("Correlation", f"{correlation:.4f}")
-        with stats_col3:
-            st.metric("Volatility (σ)", f"{volatility:.4f}")
-        with stats_col4:
-            st.metric("Sample Size", f"{len(stock_returns):,} days")
+            with stats_col1:
+                st.metric("R-squared", f"{r_squared:.4f}")
+            with stats_col2:
+                st.metric("Correlation", f"{correlation:.4f}")
+            with stats_col3:
+                st.metric("Volatility (σ)", f"{volatility:.4f}")
+            with stats_col4:
+                st.metric("Sample Size", f"{len(stock_returns):,} days")
         
-        ## Data Summary Table
-        summary_data = {
-            "Metric": ["R-squared", "Correlation with Market", "Stock Volatility", "Market Volatility", "Analysis Period"],
-            "Value": [
-                f"{r_squared:.4f}",
-                f"{correlation:.4f}",
-                f"{volatility:.4f}",
-                f"{np.std(stock_returns['SP500']):.4f}",
-                f"{len(stock_returns)} trading days ({years} year{'s' if years > 1 else ''})"
-            ],
-            "Interpretation": [
-                f"{'Strong' if r_squared > 0.7 else 'Moderate' if r_squared > 0.4 else 'Weak'} relationship with market",
-                f"{'Strong' if abs(correlation) > 0.7 else 'Moderate' if abs(correlation) > 0.4 else 'Weak'} correlation",
-                f"{'High' if volatility > 3 else 'Moderate' if volatility > 1.5 else 'Low'} volatility",
-                f"Market volatility reference",
-                f"Analysis based on {years} year{'s' if years > 1 else ''} of data"
-            ]
-        }
+            ## Data Summary Table
+            summary_data = {
+                "Metric": ["Beta 95% CI (Bootstrap)", "Beta Std. Error (HAC / Bootstrap)", "Alpha 95% CI (Bootstrap)", "Alpha Std. Error (HAC / Bootstrap)",
+                           "R-squared", "Correlation with Market", "Stock Volatility", "Residual Volatility", "Market Volatility", "Analysis Period"],
+                "Value": [
+                    f"[{errors['beta_ci_low']:.4f}, {errors['beta_ci_high']:.4f}]",
+                    f"{errors['beta_se_hac']:.4f} / {errors['beta_se_bootstrap']:.4f}",
+                    f"[{errors['alpha_ci_low']:.4f}, {errors['alpha_ci_high']:.4f}]",
+                    f"{errors['alpha_se_hac']:.4f} / {errors['alpha_se_bootstrap']:.4f}",
+                    f"{r_squared:.4f}",
+                    f"{correlation:.4f}",
+                    f"{volatility:.4f}",
+                    f"{residual_volatility:.4f}",
+                    f"{np.std(stock_returns['SP500']):.4f}",
+                    f"{len(stock_returns)} trading days ({years} year{'s' if years > 1 else ''})"
+                ],
+                "Interpretation": [
+                    f"Beta is {'significantly' if errors['beta_ci_low'] > 1 or errors['beta_ci_high'] < 1 else 'not significantly'} different from 1",
+                    f"Autocorrelation-robust (Newey-West) and block-bootstrap errors",
+                    f"Alpha is {'significantly' if errors['alpha_ci_low'] > 0 or errors['alpha_ci_high'] < 0 else 'not significantly'} different from 0",
+                    f"Daily alpha in %",
+                    f"{'Strong' if r_squared > 0.7 else 'Moderate' if r_squared > 0.4 else 'Weak'} relationship with market",
+                    f"{'Strong' if abs(correlation) > 0.7 else 'Moderate' if abs(correlation) > 0.4 else 'Weak'} correlation",
+                    f"{'High' if volatility > 3 else 'Moderate' if volatility > 1.5 else 'Low'} volatility",
+                    f"Stock-specific risk not explained by the market",
+                    f"Market volatility reference",
+                    f"Analysis based on {years} year{'s' if years > 1 else ''} of data"
+                ]
+            }
         
-        summary_df = pd.DataFrame(summary_data)
-        st.dataframe(summary_df, use_container_width=True)
+            summary_df = pd.DataFrame(summary_data)
+            st.dataframe(summary_df, width="stretch")
 
-    except Exception as e:
-        st.error(f"❌ Error loading data for {single_stock}: {str(e)}")
-        st.info("Please try selecting a different stock or check your internet connection.")
+        except Exception as e:
+            st.error(f"❌ Error loading data for {single_stock}: {str(e)}")
+            st.info("Please try selecting a different stock or check your internet connection.")
+    
+        tracing.end(trace)
+        tracing.show_panel(trace)
 
 ## Footer
 st.markdown("---")
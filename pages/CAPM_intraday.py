@@ -0,0 +1,106 @@
+## CAPM Intraday Beta Page
+
+import streamlit as st
+import utils.streaming as streaming
+import utils.symbols as symbols
+
+## Page configuration
+st.set_page_config(
+    page_title="CAPM Intraday Beta",
+    page_icon="⏱️",
+    layout="wide"
+)
+
+## Title
+st.markdown("<h1 style='text-align: center;'>⏱️ Intraday Beta</h1>", unsafe_allow_html=True)
+
+## Seconds between polls of the bar source
+POLL_SECONDS = {'1m': 15, '5m': 60, 'replay': 1}
+
+## User inputs
+input_col1, input_col2, input_col3 = st.columns([2, 1, 1])
+
+with input_col1:
+    symbol_index = symbols.get_index()
+    query = st.text_input("Search symbols", placeholder="Ticker or company name, e.g. NVDA or Nvidia")
+    # Seeded once, a default would have to stay among the options of every later search
+    current = st.session_state.setdefault("intraday_tickers", ["AAPL", "MSFT"])
+    tickers = st.multiselect(
+        "Select Stocks",
+        options=list(dict.fromkeys(current + (symbol_index.search(query) if query else symbols.DEFAULT_SYMBOLS))),
+        format_func=symbol_index.label,
+        accept_new_options=True,
+        key="intraday_tickers"
+    )
+
+with input_col2:
+    interval = st.selectbox("Bar interval", ["1m", "5m"])
+
+with input_col3:
+    window = st.number_input("Window (bars)", min_value=30, max_value=2000, value=390, step=30)
+
+replay_file = st.file_uploader("Replay bars from a CSV file instead (columns: Timestamp, Symbol, Close)", type="csv")
+
+st.caption(f"Intraday returns are regressed on {streaming.MARKET_SYMBOL}, since the SP500 index is only published daily.")
+
+## Malformed symbols are dropped before anything is polled
+tickers, unknown = symbol_index.validate(tickers)
+if unknown:
+    st.warning("Invalid symbols skipped: " + ", ".join(unknown))
+if streaming.MARKET_SYMBOL in tickers:
+    st.info(f"{streaming.MARKET_SYMBOL} is the market itself and is left out.")
+    tickers = [ticker for ticker in tickers if ticker != streaming.MARKET_SYMBOL]
+
+if not tickers:
+    st.info("Please select at least one stock to proceed.")
+    st.stop()
+
+## Start a new stream whenever the inputs change
+config = (tuple(tickers), interval, window, replay_file.file_id if replay_file else None)
+
+if st.session_state.get('intraday_config') != config:
+    if replay_file:
+        source = streaming.ReplaySource(replay_file, bars_per_poll=5)
+    else:
+        source = streaming.YahooIntradaySource(tickers + [streaming.MARKET_SYMBOL], interval)
+    st.session_state.intraday_config = config
+    st.session_state.intraday_source = source
+    st.session_state.intraday_engine = streaming.StreamingBeta(tickers, window)
+    st.session_state.intraday_previous = None
+
+
+## Only this fragment reruns on each poll, the rest of the page stays as is
+
+@st.fragment(run_every=POLL_SECONDS['replay' if replay_file else interval])
+def live_metrics():
+    engine = st.session_state.intraday_engine
+    source = st.session_state.intraday_source
+
+    try:
+        changed = engine.on_bars(source.poll())
+    except Exception as e:
+        st.error(f"❌ Error polling intraday data: {str(e)}")
+        return
+
+    if engine.count == 0:
+        st.info("⏳ Waiting for the first bars...")
+        return
+
+    metrics = engine.metrics()
+    previous = st.session_state.intraday_previous
+
+    for ticker in tickers:
+        row = metrics.loc[ticker]
+        st.markdown(f"#### {ticker}{' 🔄' if ticker in changed else ''}")
+        col1, col2, col3, col4 = st.columns(4)
+        delta = None if previous is None or ticker not in changed else f"{row['beta'] - previous.loc[ticker, 'beta']:+.4f}"
+        col1.metric("Beta (β)", f"{row['beta']:.4f}", delta)
+        col2.metric("Correlation", f"{row['correlation']:.4f}")
+        col3.metric("Volatility (σ)", f"{row['volatility']:.4f}")
+        col4.metric("Bars in window", f"{int(row['observations']):,}")
+
+    st.session_state.intraday_previous = metrics
+    st.caption(f"{engine.count:,} bars processed" + (" · replay finished" if source.finished else ""))
+
+
+live_metrics()
@@ -1,11 +1,9 @@
 ## Importing necessary libraries
-import datetime
-import numpy as np
-import pandas as pd
-import pandas_datareader.data as web
 import streamlit as st
-import yfinance as yf
-import utils.functions as fn
+import utils.risk_free as risk_free
+import utils.snapshot as snapshot
+import utils.symbols as symbols
+import utils.tracing as tracing
 
 
 ## Page configuration
@@ -23,10 +21,21 @@ st.title("CAPM Return Calculator")
 
 st.header("User Inputs")
 
+## Any listed equity or ETF: the search box narrows the options server-side,
+## symbols can also be typed straight into the selection
+symbol_index = symbols.get_index()
+query = st.text_input("Search symbols", placeholder = "Ticker or company name, e.g. NVDA or Nvidia")
+## Seeded once, a default would have to stay among the options of every later search
+current = st.session_state.setdefault("selected_stocks", ["TSLA", "GOOGL", "AMZN", "META"])
+options = list(dict.fromkeys(current + (symbol_index.search(query) if query else symbols.DEFAULT_SYMBOLS)))
+
 selected_stocks = st.multiselect("Select Stocks",
-                    options = ["AAPL", "GOOGL", "MSFT", "NFLX", "AMZN", "TSLA", "META", "NVDA", "JPM", "MGM"],
-                    default = ["TSLA", "GOOGL", "AMZN", "META"])
+                    options = options,
+                    format_func = symbol_index.label,
+                    accept_new_options = True,
+                    key = "selected_stocks")
 years = st.number_input("Investment Duration (Years)", min_value = 1, max_value = 25, value = 1, step = 1)
+rf_source = st.selectbox("Risk-Free Rate", list(risk_free.SOURCES), format_func = risk_free.SOURCES.get)
 
 
 #st.sidebar.markdown("---")
@@ -34,98 +43,158 @@ years = st.number_input("Investment Duration (Years)", min_value = 1, max_value
 
 ## Downloading stock data
 
+## Malformed symbols are dropped before anything is downloaded
+selected_stocks, unknown = symbol_index.validate(selected_stocks)
+if unknown:
+    st.warning("Invalid symbols skipped: " + ", ".join(unknown))
+
+if not selected_stocks:
+    st.warning("Please select at least one stock to proceed.")
+    st.stop()
+
+## Betas and CAPM returns from the nightly snapshot, without fetching or regressing;
+## the full analysis only runs once the detailed views are opened
+quick = snapshot.get_snapshot().lookup_all(selected_stocks, years, rf_source)
+if quick is not None:
+    st.markdown(f"### CAPM Returns (snapshot of {quick[0]['end']:%b %d, %Y})")
+    quick_cols = st.columns(min(len(quick), 6))
+    for i, row in enumerate(quick):
+        quick_cols[i % len(quick_cols)].metric(row['symbol'], f"{row['capm_return']:.2f}%", f"β {row['beta']:.4f}", delta_color = "off")
+    st.caption(f"Market return {quick[0]['rm']:.2f}%, risk-free rate {quick[0]['rf']:.2f}%.")
+
+    if not st.toggle("Show prices, charts and detailed results", help = "Loads the latest prices and runs the full analysis."):
+        st.stop()
+
+## Analysis modules pull in pandas and Plotly, only load them once there is work to do
+import pandas as pd
+import utils.analysis as an
+import utils.backtest as backtest
+import utils.functions as fn
+import utils.regression as reg
+import utils.results_view as results_view
+
+## Optional timing of this run (CAPM_TRACE=1 or ?debug=1)
+trace = tracing.begin("CAPM_return", tracing.ENABLED or st.query_params.get("debug") == "1")
+
 try:
     with st.spinner("Fetching stock data..."):
-        dt = datetime.date
-        end = dt.today()
-        start = dt(dt.today().year - years, end.month, end.day)
-        SP500 = web.DataReader(['SP500'], 'fred', start, end)
-
-        stocks_df = pd.DataFrame()
-
-        for stock in selected_stocks:
-            data = yf.download(stock, period = f'{years}y', auto_adjust=True)
-            stocks_df[f'{stock}'] = data['Close']
-
-        stocks_df.reset_index(inplace = True)
-        SP500.reset_index(inplace = True)
-        SP500.columns = ['Date', 'SP500']        
-        
-        stocks_df['Date'] = stocks_df['Date'].astype('datetime64[ns]')
-        stocks_df['Date'] = stocks_df['Date'].apply(lambda x: str(x)[:10])
-        stocks_df['Date'] = pd.to_datetime(stocks_df['Date'])
-        stocks_df = pd.merge(stocks_df, SP500, on = 'Date', how = 'inner')
+        analysis = an.get_capm_analysis(selected_stocks, years, rf_source = rf_source)
+
+    failed = analysis['failed']
+    if failed:
+        st.warning("Could not load data for: " + ", ".join(f"{stock} ({reason})" for stock, reason in failed.items()))
+
+    stocks_df = analysis['stocks_df']
+    dropped = analysis['dropped']
 
     ## Tabs for better navigation
-    tab1, tab2, tab3 = st.tabs(["📊 Price Data", "📉 Beta Analysis", "📈 CAPM Results"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 Price Data", "📉 Beta Analysis", "📈 CAPM Results", "💼 Portfolio", "🧪 Backtest"])
 
     with tab1:
+        if dropped.any():
+            st.caption("Days without an SP500 value were dropped: " +
+                       ", ".join(f"{stock} ({count})" for stock, count in dropped.items() if count))
+
         col1, col2 = st.columns([1, 1])
 
         with col1:
             st.markdown("### Raw Price Data (Head)")
-            st.dataframe(stocks_df.head(), use_container_width = True)
+            st.dataframe(stocks_df.head(), width = "stretch")
 
         with col2:
             st.markdown("### Raw Price Data (Tail)")
-            st.dataframe(stocks_df.tail(), use_container_width = True)
+            st.dataframe(stocks_df.tail(), width = "stretch")
 
         ## Plotting the CAPM return graph
         col1, col2 = st.columns([1, 1])
 
         with col1:
             st.markdown("### Price of all the stocks")
-            fig = fn.plot_capm_return(stocks_df)
-            st.plotly_chart(fig, use_container_width = True)
+            with tracing.span("render.prices"):
+                fig = fn.plot_capm_return(stocks_df)
+                st.plotly_chart(fig, width = "stretch")
 
         with col2:
             st.markdown("### Normalized Price of all the stocks")
-            normalized_df = fn.normalize_prices(stocks_df.copy())
-            fig = fn.plot_capm_return(normalized_df)
-            st.plotly_chart(fig, use_container_width = True)
+            with tracing.span("render.normalized_prices"):
+                normalized_df = fn.normalize_prices(stocks_df)
+                fig = fn.plot_capm_return(normalized_df)
+                st.plotly_chart(fig, width = "stretch")
     
 
     ## Beta Calculation
 
-    stocks_daily_returns = fn.daily_returns(stocks_df.copy())
-    
-    beta, alpha = {}, {}
-
-    for i in stocks_daily_returns.columns:
-        if i not in ['Date', 'SP500']:
-            beta[i], alpha[i] = fn.calculate_beta(stocks_daily_returns, i)
-            #beta[i] = beta
-            #alpha[i] = alpha
+    stocks_daily_returns = analysis['stocks_daily_returns']
     
+    results = an.capm_table(analysis)
 
+    ## Numeric columns, so sorting and filtering compare values rather than text
     beta_df = pd.DataFrame({
-        'Stock': beta.keys(),
-        'Beta Value': [str(round(i, 4)) for i in beta.values()]
+        'Stock': results['Stock'],
+        'Beta Value': results['beta'],
+        'Beta 95% CI Low': results['beta_ci_low'],
+        'Beta 95% CI High': results['beta_ci_high'],
+        'Beta SE (HAC)': results['beta_se_hac'],
     })
-    beta_df = beta_df.sort_values(by = 'Beta Value', ascending = False).reset_index(drop = True)
 
 
     with tab2:
         st.markdown("### Beta Values for Selected Stocks")
-        st.dataframe(beta_df.style.background_gradient(cmap='coolwarm'), use_container_width = True)
+        results_view.show_table(beta_df, "beta", sort_by = 'Beta Value',
+                                formats = {col: "%.4f" for col in beta_df.columns[1:]}, file_name = "capm_betas")
+
+        ## Fama-French / momentum loadings of every stock, next to the CAPM beta
+        st.markdown("### Multi-Factor Exposures")
+        factor_fits = analysis['factor_fits']
+        if not factor_fits:
+            st.info("Add the Fama-French daily factor CSVs to `data/factors` (or `CAPM_FACTORS_DIR`) to see factor loadings.")
+        else:
+            factor_model = st.selectbox("Factor model", list(factor_fits), index = len(factor_fits) - 1)
+            fit = factor_fits[factor_model]
+            factor_df = pd.concat([
+                results.set_index('Stock')['beta'].rename('CAPM Beta'),
+                fit.loadings,
+                fit.t_stats.add_suffix(' t'),
+                fit.r_squared.rename('R²'),
+                fit.implied_return.rename('Implied Return (%)'),
+            ], axis = 1).reset_index()
+            results_view.show_table(factor_df, "factors", sort_by = 'CAPM Beta',
+                                    formats = {col: "%.4f" for col in factor_df.columns[1:]}, file_name = "factor_exposures")
+            st.caption("Loadings with |t| above 2 are significant at about the 5% level.")
+
+        st.markdown("### Rolling Beta")
+        window = st.selectbox("Rolling window (trading days)", [60, 126, 252], index = 1)
+        with tracing.span("render.rolling_beta"):
+            rolling_df = reg.rolling_beta(stocks_daily_returns, window)
+            st.plotly_chart(fn.plot_rolling_beta(rolling_df), width = "stretch")
     
 
     ## CAPM Return Calculation
 
-    rf = 0
-    rm = stocks_daily_returns['SP500'].mean() * 252
+    rf = analysis['rf']
+    rm = analysis['rm']
     
+    ## Bootstrap beta interval mapped through the CAPM line (the ends swap when Rm < Rf)
+    return_bounds = an.capm_return(results[['beta_ci_low', 'beta_ci_high']].to_numpy(), rm, rf)
+
     return_df = pd.DataFrame(
         {
-            'Stock': list(beta.keys()),
-            'Return Value (%)': [round(rf + (value * (rm - rf)), 2) for value in beta.values()]
+            'Stock': results['Stock'],
+            'Return Value (%)': results['capm_return'],
+            'Return 95% CI Low (%)': return_bounds.min(axis = 1),
+            'Return 95% CI High (%)': return_bounds.max(axis = 1),
+            'Beta SE (HAC)': results['beta_se_hac'],
+            'Beta SE (Bootstrap)': results['beta_se_bootstrap'],
+            'Alpha SE (HAC)': results['alpha_se_hac'],
         }
     )
-    return_df = return_df.sort_values(by = 'Return Value (%)', ascending = False).reset_index(drop = True)
+    if factor_fits:
+        return_df[f'{factor_model} Implied Return (%)'] = fit.implied_return.reindex(results['Stock']).to_numpy()
+    return_formats = {col: "%.2f" if col.endswith('(%)') else "%.4f" for col in return_df.columns[1:]}
 
     # with col2:
     #     st.markdown("### Calculated return using CAPM")
-    #     st.dataframe(return_df, use_container_width = True)
+    #     st.dataframe(return_df, width = "stretch")
     
     with tab3:
         st.markdown("### 📌 CAPM Formula")
@@ -137,15 +206,78 @@ try:
         kpi2.metric("Risk-Free Rate (Rf)", f"{rf:.2f}%")
 
         st.markdown("### Calculated Return Using CAPM")
-        st.dataframe(return_df.style.background_gradient(cmap="YlGn"), use_container_width=True)
-
-        ## Download button
-        st.download_button(
-            "📥 Download CAPM Results",
-            return_df.to_csv(index=False),
-            "capm_results.csv",
-            "text/csv"
-        )
-
-except:
-    st.warning("Please select at least one stock to proceed.")
\ No newline at end of file
+        results_view.show_table(return_df, "returns", sort_by = 'Return Value (%)', formats = return_formats)
+
+    ## Portfolio what-if analysis, reusing the covariance matrix of the cached analysis
+
+    with tab4:
+        st.markdown("### Portfolio Weights")
+        model = analysis['portfolio']
+        weight_cols = st.columns(min(len(model.stocks), 5))
+        weights = [
+            weight_cols[i % len(weight_cols)].slider(stock, 0, 100, 100 // len(model.stocks), key = f"weight_{stock}")
+            for i, stock in enumerate(model.stocks)
+        ]
+
+        if sum(weights) == 0:
+            st.info("Give at least one stock a positive weight.")
+        else:
+            stats = model.evaluate(weights, rm, rf)
+
+            kpi1, kpi2, kpi3, kpi4 = st.columns(4)
+            kpi1.metric("Portfolio Beta (β)", f"{stats['beta']:.4f}")
+            kpi2.metric("Expected Return (CAPM)", f"{stats['capm_return']:.2f}%")
+            kpi3.metric("Volatility (annual)", f"{stats['volatility']:.2f}%")
+            kpi4.metric("Tracking Error vs SP500", f"{stats['tracking_error']:.2f}%")
+
+            st.markdown("### Risk Contribution by Stock")
+            st.bar_chart(stats['risk_contributions'] * 100, y_label = "Share of portfolio variance (%)")
+
+    ## Walk-forward backtest: betas re-estimated at every rebalance date from the trailing
+    ## window only, predictions scored against the returns realized afterwards
+
+    with tab5:
+        st.markdown("### Walk-Forward Backtest")
+        bt_col1, bt_col2, bt_col3 = st.columns(3)
+        history = bt_col1.number_input("History (years)", min_value = 2, max_value = 25, value = max(years, 10), step = 1)
+        window_years = bt_col2.selectbox("Estimation window", [1, 2, 3, 5], format_func = lambda y: f"{y} year{'s' if y > 1 else ''}")
+        frequency = bt_col3.selectbox("Rebalance", list(backtest.FREQUENCIES))
+
+        if st.toggle("Run backtest", help = "Loads the longer history for the selected stocks"):
+            with st.spinner("Running backtest..."), tracing.span("backtest"):
+                history_returns = an.get_capm_analysis(selected_stocks, history, rf_source = rf_source)['stocks_daily_returns']
+                bt_results = backtest.walk_forward(history_returns, window = 252 * window_years,
+                                                   frequency = backtest.FREQUENCIES[frequency])
+
+            if bt_results.empty:
+                st.info("Not enough history for this estimation window.")
+            else:
+                bt_stats = backtest.error_stats(bt_results)
+                overall = bt_stats.loc['All']
+                rank_ic = backtest.rank_ic(bt_results).mean()
+
+                kpi1, kpi2, kpi3, kpi4, kpi5 = st.columns(5)
+                kpi1.metric("CAPM Forecast MAE", f"{overall['predicted_mae']:.2f}%")
+                kpi2.metric("CAPM Forecast Hit Rate", f"{overall['predicted_hit_rate']:.1%}")
+                kpi3.metric("Beta-Only MAE", f"{overall['conditional_mae']:.2f}%")
+                kpi4.metric("Beta-Only Hit Rate", f"{overall['conditional_hit_rate']:.1%}")
+                kpi5.metric("Rank IC", "n/a" if pd.isna(rank_ic) else f"{rank_ic:.3f}")
+                st.caption(f"{int(overall['periods']):,} stock-periods. The CAPM forecast uses the window's average market "
+                           "premium; beta-only uses the market return realized over the period, so it scores beta alone. "
+                           "Errors are in % excess return per period.")
+
+                st.markdown("### Average Predicted vs Realized Excess Return per Period")
+                st.line_chart(bt_results.groupby('Date')[['predicted', 'conditional', 'realized']].mean())
+
+                st.markdown("### Error Statistics by Stock")
+                bt_table = bt_stats.rename_axis('Stock').reset_index()
+                results_view.show_table(bt_table, "backtest", sort_by = 'predicted_mae', ascending = True,
+                                        formats = {col: "%.4f" for col in bt_table.columns[2:]},
+                                        file_name = "capm_backtest")
+
+except Exception as e:
+    st.error(f"❌ Error calculating CAPM returns: {str(e)}")
+    st.info("Please try a different selection or check your internet connection.")
+
+tracing.end(trace)
+tracing.show_panel(trace)
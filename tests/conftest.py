@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import utils.data_store as store
+import utils.factors as factors
+from utils.fetch import LocalSource
+
+
+## Synthetic daily closes for the market and one stock, written as the CSV files
+## LocalSource reads. The stock skips a few days the market traded.
+
+@pytest.fixture
+def local_prices(tmp_path, monkeypatch):
+    rng = np.random.default_rng(7)
+    dates = pd.bdate_range('2019-01-01', '2026-06-30')
+    market_returns = rng.normal(0.0003, 0.01, len(dates))
+    market = 3000 * np.exp(np.cumsum(market_returns))
+    stock = 50 * np.exp(np.cumsum(1.2 * market_returns + rng.normal(0, 0.01, len(dates))))
+
+    data_dir = tmp_path / 'local'
+    data_dir.mkdir()
+    pd.DataFrame({'Date': dates, 'Close': market}).to_csv(data_dir / 'SP500.csv', index = False)
+    traded = rng.random(len(dates)) > 0.02
+    pd.DataFrame({'Date': dates[traded], 'Close': stock[traded]}).to_csv(data_dir / 'STK.csv', index = False)
+
+    source = LocalSource(str(data_dir))
+    monkeypatch.setattr(store, 'SOURCES', {'yahoo': source, 'fred': source})
+    monkeypatch.setattr(store, 'STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.setattr(factors, 'FACTORS_DIR', str(tmp_path / 'factors'))
+    return data_dir
+
+
+## Daily excess returns (in %) of the market and three stocks; B misses scattered
+## days and C only starts partway through
+
+@pytest.fixture
+def returns():
+    rng = np.random.default_rng(11)
+    dates = pd.bdate_range('2024-01-01', periods = 500)
+    market = rng.normal(0.04, 1.0, len(dates))
+    frame = pd.DataFrame({
+        'Date': dates,
+        'SP500': market,
+        'A': 0.02 + 1.3 * market + rng.normal(0, 0.8, len(dates)),
+        'B': -0.01 + 0.7 * market + rng.normal(0, 1.2, len(dates)),
+        'C': 0.9 * market + rng.normal(0, 1.0, len(dates)),
+    })
+    frame.loc[rng.random(len(dates)) < 0.05, 'B'] = np.nan
+    frame.loc[:199, 'C'] = np.nan
+    return frame
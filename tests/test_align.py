@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from utils.align import align_to_benchmark, normalize_dates
+
+
+def test_normalize_dates_keeps_the_local_calendar_date():
+    index = pd.DatetimeIndex(['2026-10-15 16:00', '2026-10-16 09:30']).tz_localize('America/New_York')
+    assert list(normalize_dates(index)) == [pd.Timestamp('2026-10-15'), pd.Timestamp('2026-10-16')]
+
+
+def test_rows_follow_the_benchmark_calendar():
+    days = pd.bdate_range('2026-09-01', periods = 10, name = 'Date')
+    benchmark = pd.Series(np.arange(9.0), index = days.delete(4))
+    ## Day 4 is not a benchmark day, A is missing day 2 and B has no prices after day 6
+    prices = pd.DataFrame({'A': np.arange(10.0) + 100, 'B': np.arange(10.0) + 200}, index = days)
+    prices = prices.drop(days[2])
+    prices.loc[days[7]:, 'B'] = np.nan
+
+    aligned, dropped = align_to_benchmark(prices.iloc[::-1], benchmark)
+
+    assert list(aligned.columns) == ['Date', 'A', 'B', 'SP500']
+    assert list(aligned['Date']) == list(days.delete(4))
+    assert np.isnan(aligned.loc[2, ['A', 'B']].to_numpy(dtype = float)).all()
+    assert aligned['A'].iloc[-1] == 109 and np.isnan(aligned['B'].iloc[-3:]).all()
+    assert dropped.to_dict() == {'A': 1, 'B': 1}
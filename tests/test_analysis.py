@@ -0,0 +1,26 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+import utils.analysis as an
+
+
+@pytest.mark.parametrize('rf_source', ['none', '4.5'])
+def test_refresh_matches_a_full_build(local_prices, rf_source):
+    start, end = datetime.date(2026, 3, 2), datetime.date(2026, 4, 15)
+    refreshed = an.refresh_beta_analysis(an.build_beta_analysis('STK', 3, start, rf_source), end)
+    built = an.build_beta_analysis('STK', 3, end, rf_source)
+
+    pd.testing.assert_frame_equal(refreshed['stock_returns'], built['stock_returns'])
+    for name in ('beta_value', 'alpha_value', 'r_squared', 'capm_return', 'rm', 'rf', 'correlation', 'volatility'):
+        assert refreshed[name] == pytest.approx(built[name], rel = 1e-9, abs = 1e-12), name
+
+
+def test_single_stock_and_multi_stock_analyses_agree(local_prices):
+    end = datetime.date(2026, 4, 15)
+    single = an.build_beta_analysis('STK', 2, end)
+    table = an.capm_table(an.build_capm_analysis(['STK'], 2, end)).set_index('Stock')
+
+    assert table.loc['STK', 'beta'] == pytest.approx(single['beta_value'])
+    assert table.loc['STK', 'capm_return'] == pytest.approx(single['capm_return'])
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+import utils.backtest as backtest
+
+
+def _returns(end):
+    rng = np.random.default_rng(3)
+    dates = pd.bdate_range('2024-01-01', end)
+    market = rng.normal(0.03, 1, len(dates))
+    return pd.DataFrame({'Date': dates, 'SP500': market, 'STK': 1.2 * market + rng.normal(0, 1, len(dates))})
+
+
+def test_partial_last_period_is_not_scored():
+    results = backtest.walk_forward(_returns('2026-10-16'), window = 126)
+
+    assert results['Date'].iloc[-1] == pd.Timestamp('2026-08-31')
+    assert results['days'].min() >= 19
+
+
+def test_data_ending_on_a_period_end_scores_the_last_period():
+    results = backtest.walk_forward(_returns('2026-09-30'), window = 126)
+
+    assert results['Date'].iloc[-1] == pd.Timestamp('2026-08-31')
+    assert results['days'].iloc[-1] == len(pd.bdate_range('2026-09-01', '2026-09-30'))
+
+
+def test_predictions_use_the_trailing_window_only():
+    returns = _returns('2026-09-30')
+    results = backtest.walk_forward(returns, window = 126).set_index('Date')
+
+    date = pd.Timestamp('2025-06-30')
+    window = returns[returns['Date'] <= date].tail(126)
+    beta = np.polyfit(window['SP500'], window['STK'], 1)[0]
+    assert np.isclose(results.loc[date, 'beta'], beta)
@@ -0,0 +1,130 @@
+import datetime
+import types
+
+import pandas as pd
+
+import utils.data_store as store
+
+D = datetime.date
+
+
+def _series(*days):
+    return pd.Series(1.0, index = pd.DatetimeIndex([pd.Timestamp(day) for day in days], name = 'Date'))
+
+
+def _meta(start, end, fetched_at):
+    return {'start': start, 'end': end, 'fetched_at': fetched_at.timestamp()}
+
+
+def test_nothing_stored_fetches_everything():
+    assert store._missing_ranges(None, None, D(2024, 1, 1), D(2024, 6, 1), D(2024, 6, 1)) == [(D(2024, 1, 1), D(2024, 6, 1))]
+
+
+def test_earlier_start_fetches_the_head():
+    series = _series(D(2024, 3, 1), D(2024, 3, 4))
+    meta = _meta(D(2024, 3, 1), D(2024, 3, 4), datetime.datetime(2024, 3, 5, 9))
+    ranges = store._missing_ranges(series, meta, D(2024, 2, 1), D(2024, 3, 4), D(2024, 3, 10))
+    assert ranges == [(D(2024, 2, 1), D(2024, 2, 29))]
+
+
+def test_later_end_fetches_only_the_new_days():
+    series = _series(D(2024, 3, 1), D(2024, 3, 4))
+    meta = _meta(D(2024, 3, 1), D(2024, 3, 4), datetime.datetime(2024, 3, 5, 9))
+    ranges = store._missing_ranges(series, meta, D(2024, 3, 1), D(2024, 3, 8), D(2024, 3, 8))
+    assert ranges == [(D(2024, 3, 5), D(2024, 3, 8))]
+
+
+def test_bar_fetched_during_its_session_is_fetched_again():
+    ## The 4th was stored at noon on the 4th, its close was not final yet
+    series = _series(D(2024, 3, 1), D(2024, 3, 4))
+    meta = _meta(D(2024, 3, 1), D(2024, 3, 4), datetime.datetime(2024, 3, 4, 12))
+    ranges = store._missing_ranges(series, meta, D(2024, 3, 1), D(2024, 3, 5), D(2024, 3, 5))
+    assert ranges == [(D(2024, 3, 4), D(2024, 3, 5))]
+
+
+def test_lagging_source_resumes_after_the_last_bar(monkeypatch):
+    ## Loaded on Monday the 5th before the source published Friday the 2nd's successors
+    series = _series(D(2026, 10, 1), D(2026, 10, 2))
+    fetched = datetime.datetime(2026, 10, 5, 9)
+    meta = _meta(D(2026, 9, 1), D(2026, 10, 5), fetched)
+    monkeypatch.setattr(store.time, 'time', lambda: fetched.timestamp() + store.TTL_SECONDS + 1)
+
+    ranges = store._missing_ranges(series, meta, D(2026, 9, 1), D(2026, 10, 6), D(2026, 10, 6))
+    assert ranges == [(D(2026, 10, 3), D(2026, 10, 6))]
+
+    ## The same window asked again the next day still fills the gap
+    ranges = store._missing_ranges(series, meta, D(2026, 9, 1), D(2026, 10, 5), D(2026, 10, 6))
+    assert ranges == [(D(2026, 10, 3), D(2026, 10, 5))]
+
+
+def test_one_load_a_day_keeps_up_with_a_lagging_source(local_prices, monkeypatch):
+    today = [None]
+
+    class Today(datetime.date):
+        @classmethod
+        def today(cls):
+            return today[0]
+
+    ## Every load runs at 9:00 against a source that only has bars up to the day before
+    source = store.SOURCES['fred']
+    fetch = source.fetch
+    monkeypatch.setattr(source, 'fetch', lambda symbol, lo, hi: fetch(symbol, lo, min(hi, today[0] - datetime.timedelta(days = 1))))
+    monkeypatch.setattr(store, 'datetime', types.SimpleNamespace(date = Today, timedelta = datetime.timedelta))
+    monkeypatch.setattr(store.time, 'time', lambda: datetime.datetime.combine(today[0], datetime.time(9)).timestamp())
+
+    for day in pd.bdate_range('2026-06-01', '2026-06-30'):
+        today[0] = day.date()
+        series = store.load_series('SP500', D(2026, 5, 1), D(2026, 6, 30), source = 'fred')
+        assert series.index[-1] == pd.Timestamp(today[0]) - pd.offsets.BDay()
+
+
+def test_today_is_refetched_once_the_ttl_expires(monkeypatch):
+    series = _series(D(2024, 3, 1), D(2024, 3, 4))
+    fetched = datetime.datetime(2024, 3, 4, 12)
+    meta = _meta(D(2024, 3, 1), D(2024, 3, 4), fetched)
+
+    monkeypatch.setattr(store.time, 'time', lambda: fetched.timestamp() + 60)
+    assert store._missing_ranges(series, meta, D(2024, 3, 1), D(2024, 3, 4), D(2024, 3, 4)) == []
+
+    monkeypatch.setattr(store.time, 'time', lambda: fetched.timestamp() + store.TTL_SECONDS + 1)
+    assert store._missing_ranges(series, meta, D(2024, 3, 1), D(2024, 3, 4), D(2024, 3, 4)) == [(D(2024, 3, 4), D(2024, 3, 4))]
+
+
+def test_load_series_reads_stored_ranges_back(local_prices, monkeypatch):
+    calls = []
+    source = store.SOURCES['yahoo']
+    fetch = source.fetch
+    monkeypatch.setattr(source, 'fetch', lambda *args: calls.append(args) or fetch(*args))
+
+    first = store.load_series('STK', D(2023, 1, 1), D(2023, 6, 30))
+    again = store.load_series('STK', D(2023, 2, 1), D(2023, 5, 31))
+    assert len(calls) == 1
+    pd.testing.assert_series_equal(again, first.loc['2023-02-01':'2023-05-31'])
+
+    store.load_series('STK', D(2022, 10, 1), D(2023, 6, 30))
+    assert calls[-1][1:] == (D(2022, 10, 1), D(2022, 12, 31))
+
+
+def test_empty_answer_during_an_outage_is_fetched_again(local_prices, monkeypatch):
+    store.load_series('STK', D(2025, 1, 1), D(2026, 6, 30))
+
+    source = store.SOURCES['yahoo']
+    fetch = source.fetch
+    monkeypatch.setattr(source, 'fetch', lambda symbol, lo, hi: fetch(symbol, lo, hi).iloc[:0])
+    assert store.load_series('STK', D(2020, 1, 1), D(2026, 6, 30)).index[0] >= pd.Timestamp('2025-01-01')
+
+    monkeypatch.setattr(source, 'fetch', fetch)
+    series = store.load_series('STK', D(2020, 1, 1), D(2026, 6, 30))
+    assert series.index[0] < pd.Timestamp('2020-01-10')
+
+
+def test_empty_range_before_the_listing_is_not_fetched_again(local_prices, monkeypatch):
+    calls = []
+    source = store.SOURCES['yahoo']
+    fetch = source.fetch
+    monkeypatch.setattr(source, 'fetch', lambda *args: calls.append(args) or fetch(*args))
+
+    store.load_series('STK', D(2015, 1, 1), D(2026, 6, 30))
+    store.load_series('STK', D(2010, 1, 1), D(2026, 6, 30))
+    store.load_series('STK', D(2010, 1, 1), D(2026, 6, 30))
+    assert len(calls) == 2
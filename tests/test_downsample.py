@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import utils.downsample as downsample
+
+
+def test_minmax_last_bucket_is_never_all_padding():
+    kept = downsample.minmax(np.arange(13.0), 12)
+
+    assert kept[0] == 0 and kept[-1] == 12
+    assert np.all(np.diff(kept) > 0)
+
+
+@pytest.mark.parametrize('n', [13, 50, 101, 997])
+def test_minmax_keeps_every_spike(n):
+    y = np.random.default_rng(n).normal(0, 1, n)
+    y[n // 3] = 50
+    y[2 * n // 3] = -50
+    kept = downsample.minmax(y, 12)
+
+    assert {n // 3, 2 * n // 3, 0, n - 1} <= set(kept)
+    assert len(kept) <= 12 + 2
+
+
+@pytest.mark.parametrize('n, n_out', [(10, 3), (10, 9), (100, 7), (1000, 100), (5003, 400)])
+def test_lttb_keeps_the_endpoints_and_n_out_points(n, n_out):
+    rng = np.random.default_rng(n_out)
+    x = np.sort(rng.uniform(0, 100, n))
+    kept = downsample.lttb(x, rng.normal(0, 1, n), n_out)
+
+    assert len(kept) == n_out
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_downsample_drops_missing_values_first():
+    y = np.arange(100.0)
+    y[::7] = np.nan
+    x, kept = downsample.downsample(np.arange(100), y, 20)
+
+    assert len(x) == 20 and not np.isnan(kept).any()
+    assert x[0] == 1 and x[-1] == 99
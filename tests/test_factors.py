@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.factors as factors
+
+
+def _design(n = 400, seed = 9):
+    rng = np.random.default_rng(seed)
+    F = rng.normal(0, 1, (n, 3))
+    D = np.column_stack([np.ones(n), F])
+    loadings = np.array([[0.02, 1.1, 0.3, -0.2], [-0.01, 0.8, -0.4, 0.5]])
+    Y = D @ loadings.T + rng.normal(0, 0.5, (n, 2))
+    return rng, D, Y
+
+
+def test_solve_matches_lstsq_without_gaps():
+    _, D, Y = _design()
+    coef, t_stats, r_squared, n = factors.solve(D, Y, np.ones_like(Y, dtype = bool))
+
+    expected, ss_res, *_ = np.linalg.lstsq(D, Y, rcond = None)
+    np.testing.assert_allclose(coef, expected.T)
+    np.testing.assert_allclose(r_squared, 1 - ss_res / ((Y - Y.mean(axis = 0)) ** 2).sum(axis = 0))
+    assert list(n) == [len(D)] * 2
+
+
+def test_solve_with_gaps_uses_each_stocks_own_days():
+    rng, D, Y = _design()
+    mask = np.ones_like(Y, dtype = bool)
+    mask[rng.random(len(D)) < 0.1, 1] = False
+    coef, t_stats, _, n = factors.solve(D, np.where(mask, Y, 0.0), mask)
+
+    for s in range(Y.shape[1]):
+        rows = mask[:, s]
+        expected, ss_res, *_ = np.linalg.lstsq(D[rows], Y[rows, s], rcond = None)
+        np.testing.assert_allclose(coef[s], expected)
+        ## t-stats use the classical OLS standard errors
+        se = np.sqrt(ss_res[0] / (rows.sum() - D.shape[1]) * np.diag(np.linalg.inv(D[rows].T @ D[rows])))
+        np.testing.assert_allclose(t_stats[s], expected / se)
+        assert n[s] == rows.sum()
+
+
+def test_fit_models_recovers_the_loadings():
+    _, D, Y = _design(2000)
+    dates = pd.bdate_range('2020-01-01', periods = len(D))
+    table = pd.DataFrame(D[:, 1:], index = dates, columns = ['Mkt-RF', 'SMB', 'HML'])
+    table['RF'] = 0.0
+    returns = pd.DataFrame({'Date': dates, 'SP500': table['Mkt-RF'].to_numpy(), 'X': Y[:, 0]})
+
+    fits = factors.fit_models(returns, factors = table, models = ['FF3'])
+    assert fits['FF3'].loadings.loc['X'].to_numpy() == pytest.approx([0.02, 1.1, 0.3, -0.2], abs = 0.05)
@@ -0,0 +1,39 @@
+import time
+
+from utils.fetch import run_concurrently, with_retry
+
+
+def test_run_concurrently_collects_partial_failures():
+    def fail():
+        raise LookupError("no data")
+
+    results, errors = run_concurrently({'A': lambda: 1, 'B': fail, 'C': lambda: 3}, max_workers = 2)
+
+    assert results == {'A': 1, 'C': 3}
+    assert errors == {'B': "LookupError: no data"}
+
+
+def test_run_concurrently_reports_timeouts_without_waiting():
+    start = time.perf_counter()
+    results, errors = run_concurrently({'fast': lambda: 1, 'slow': lambda: time.sleep(2)}, timeout = 0.2)
+
+    assert results == {'fast': 1}
+    assert errors == {'slow': "timed out"}
+    assert time.perf_counter() - start < 1
+
+
+def test_run_concurrently_without_tasks():
+    assert run_concurrently({}) == ({}, {})
+
+
+def test_with_retry_succeeds_after_transient_errors():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("reset")
+        return 'ok'
+
+    assert with_retry(flaky, retries = 2, backoff = 0) == 'ok'
+    assert len(calls) == 3
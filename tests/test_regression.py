@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import utils.regression as reg
+
+
+def test_regress_on_market_matches_polyfit(returns):
+    summary = reg.regress_on_market(returns)
+
+    assert list(summary.index) == ['A', 'B', 'C']
+    for stock in summary.index:
+        rows = returns[['SP500', stock]].dropna()
+        beta, alpha = np.polyfit(rows['SP500'], rows[stock], 1)
+        assert summary.loc[stock, 'beta'] == pytest.approx(beta)
+        assert summary.loc[stock, 'alpha'] == pytest.approx(alpha)
+        assert summary.loc[stock, 'r_squared'] == pytest.approx(rows.corr().iloc[0, 1] ** 2)
+        assert summary.loc[stock, 'observations'] == len(rows)
+
+
+def test_market_gaps_are_left_out(returns):
+    returns.loc[10:19, 'SP500'] = np.nan
+    summary = reg.regress_on_market(returns)
+
+    rows = returns[['SP500', 'A']].dropna()
+    assert summary.loc['A', 'beta'] == pytest.approx(np.polyfit(rows['SP500'], rows['A'], 1)[0])
+    assert summary.loc['A', 'observations'] == len(returns) - 10
+
+
+def test_running_stats_match_a_full_regression(returns):
+    stats = reg.RegressionStats(['A', 'B', 'C'])
+    for x, y in zip(returns['SP500'].to_numpy(), returns[['A', 'B', 'C']].to_numpy()):
+        stats.add(x, y)
+    for x, y in zip(returns['SP500'].to_numpy()[:100], returns[['A', 'B', 'C']].to_numpy()[:100]):
+        stats.remove(x, y)
+
+    expected = reg.regress_on_market(returns.iloc[100:])
+    np.testing.assert_allclose(stats.summary()[['beta', 'alpha', 'correlation']], expected[['beta', 'alpha', 'correlation']])
+
+
+## Rolling beta from pandas' own covariance and variance over the rows a stock has
+
+def _pandas_rolling_beta(returns, stock, window, min_periods):
+    rows = returns[['SP500', stock]].dropna()
+    rolling = rows['SP500'].rolling(window, min_periods = min_periods) if window else rows['SP500'].expanding(min_periods)
+    beta = rolling.cov(rows[stock]) / rolling.var()
+    return beta.reindex(returns.index)
+
+
+@pytest.mark.parametrize('window', [60, None])
+def test_rolling_beta_matches_pandas(returns, window):
+    betas = reg.rolling_beta(returns, window = window, min_periods = 20)
+
+    ## Windows count rows, so only a gap-free stock lines up with pandas' windows
+    expected = _pandas_rolling_beta(returns, 'A', window, 20)
+    np.testing.assert_allclose(betas['A'].to_numpy(), expected.to_numpy(), rtol = 1e-8)
+
+
+def test_rolling_beta_over_gaps(returns):
+    betas = reg.rolling_beta(returns, window = 60, min_periods = 20)
+
+    for stock in ('B', 'C'):
+        for end in (250, 330, 499):
+            rows = returns.iloc[end - 59:end + 1][['SP500', stock]].dropna()
+            if len(rows) < 20:
+                assert np.isnan(betas[stock].iloc[end])
+            else:
+                assert betas[stock].iloc[end] == pytest.approx(np.polyfit(rows['SP500'], rows[stock], 1)[0])
+
+    ## C has no returns before row 200 and then needs min_periods of its own
+    assert betas['C'].iloc[:218].isna().all() and betas['C'].iloc[219:].notna().all()
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+import utils.shared_tier as shared_tier
+
+
+@pytest.fixture(params = ['memory', 'sqlite'])
+def tier(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_tier, 'POLL_SECONDS', 0.01)
+    backend = shared_tier.MemoryBackend() if request.param == 'memory' else shared_tier.SQLiteBackend(str(tmp_path))
+    return shared_tier.SharedTier(backend)
+
+
+def _run_together(count, func):
+    results = [None] * count
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        barrier.wait()
+        results[i] = func()
+
+    threads = [threading.Thread(target = run, args = (i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_compute_once(tier):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'beta': 1.25}
+
+    key = (('AAPL',), 5, '2026-10-16', 'none', 'simple')
+    results = _run_together(2, lambda: tier.get_or_compute(key, compute))
+
+    assert len(calls) == 1
+    assert results == [{'beta': 1.25}, {'beta': 1.25}]
+    assert tier.get(key) == {'beta': 1.25}
+
+
+def test_vetoed_results_are_not_stored(tier):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return len(calls)
+
+    assert tier.get_or_compute('key', compute, should_cache = lambda value: False) == 1
+    assert tier.get_or_compute('key', compute, should_cache = lambda value: False) == 2
+    assert tier.get('key') is None
+
+
+def test_abandoned_lease_is_taken_over(tier):
+    tier.lease_seconds = 0.2
+    ## A node that died while holding the lease
+    assert tier.backend.acquire("lease:'key'", 'dead node', 0.2)
+    assert not tier.backend.acquire("lease:'key'", 'other node', 0.2)
+
+    start = time.perf_counter()
+    assert tier.get_or_compute('key', lambda: 'computed') == 'computed'
+    assert time.perf_counter() - start >= 0.15
+
+
+def test_lock_is_exclusive(tier):
+    inside, overlaps = [], []
+
+    def hold():
+        with tier.lock('prices:AAPL'):
+            overlaps.append(len(inside))
+            inside.append(1)
+            time.sleep(0.05)
+            inside.pop()
+
+    _run_together(3, hold)
+    assert overlaps == [0, 0, 0]
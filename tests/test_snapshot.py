@@ -0,0 +1,49 @@
+import datetime
+
+import pytest
+
+import utils.analysis as an
+import utils.snapshot as snapshot
+
+END = datetime.date(2026, 4, 15)
+
+
+@pytest.fixture
+def built(local_prices, tmp_path):
+    path = str(tmp_path / 'snapshot.npy')
+    rows, failed = snapshot.build(['STK'], END, ('none', '4.5'), years = (1, 3), path = path, processes = 1)
+    assert rows == 4 and failed == {}
+    return snapshot.Snapshot.load(path)
+
+
+@pytest.mark.parametrize('rf_source', ['none', '4.5'])
+@pytest.mark.parametrize('years', [1, 3])
+def test_snapshot_rows_match_the_pages(built, years, rf_source):
+    row = built.lookup('STK', years, rf_source, today = END)
+    single = an.build_beta_analysis('STK', years, END, rf_source)
+    table = an.capm_table(an.build_capm_analysis(['STK'], years, END, rf_source)).set_index('Stock')
+
+    for name, page in (('beta', 'beta_value'), ('alpha', 'alpha_value'), ('r_squared', 'r_squared'),
+                       ('capm_return', 'capm_return'), ('rm', 'rm'), ('rf', 'rf')):
+        assert row[name] == pytest.approx(single[page], rel = 1e-9, abs = 1e-12), name
+    assert row['beta'] == pytest.approx(table.loc['STK', 'beta'], rel = 1e-9)
+    assert row['capm_return'] == pytest.approx(table.loc['STK', 'capm_return'], rel = 1e-9)
+
+
+def test_lookup_misses(built):
+    assert built.lookup('STK', 2, today = END) is None
+    assert built.lookup('OTHER', 1, today = END) is None
+    assert built.lookup('STK', 1, today = END + datetime.timedelta(days = snapshot.MAX_AGE_DAYS + 1)) is None
+    assert built.lookup_all(['STK', 'OTHER'], 1, today = END) is None
+
+
+def test_longest_symbols_are_kept_whole(local_prices, tmp_path):
+    ## Symbols may be up to 16 characters with a leading ^, these share their first 12
+    for symbol in ('^ABCDEFGHIJKLMNO', '^ABCDEFGHIJKLXYZ'):
+        (local_prices / f'{symbol}.csv').write_text((local_prices / 'STK.csv').read_text())
+    path = str(tmp_path / 'snapshot.npy')
+    snapshot.build(['^ABCDEFGHIJKLMNO', '^ABCDEFGHIJKLXYZ'], END, years = (1,), path = path, processes = 1)
+
+    built = snapshot.Snapshot.load(path)
+    assert len(built) == 2
+    assert built.lookup_all(['^ABCDEFGHIJKLMNO', '^ABCDEFGHIJKLXYZ'], 1, today = END) is not None
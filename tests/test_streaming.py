@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.regression as reg
+import utils.streaming as streaming
+
+
+## One-minute bars of the market and two tickers, in the long format ReplaySource reads
+
+def _bars(n = 200, seed = 5):
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range('2026-10-16 09:30', periods = n, freq = 'min')
+    market = rng.normal(0, 0.001, n)
+    closes = {
+        'SPY': 600 * np.exp(np.cumsum(market)),
+        'AAA': 100 * np.exp(np.cumsum(1.5 * market + rng.normal(0, 0.001, n))),
+        'BBB': 50 * np.exp(np.cumsum(0.5 * market + rng.normal(0, 0.001, n))),
+    }
+    return pd.DataFrame([
+        {'Timestamp': timestamp, 'Symbol': symbol, 'Close': values[i]}
+        for symbol, values in closes.items() for i, timestamp in enumerate(timestamps)
+    ])
+
+
+def test_market_symbol_is_not_a_ticker():
+    engine = streaming.StreamingBeta(['AAA', 'SPY'], window = 30, resync_every = 10)
+    engine.on_bars(streaming.ReplaySource(_bars(50), bars_per_poll = 50).poll())
+
+    assert engine.tickers == ['AAA']
+    assert list(engine.metrics().index) == ['AAA']
+
+
+def _replay(bars, engine, bars_per_poll = 7):
+    source = streaming.ReplaySource(bars, bars_per_poll = bars_per_poll)
+    while not source.finished:
+        engine.on_bars(source.poll())
+    return engine
+
+
+@pytest.mark.parametrize('resync_every', [None, 25])
+def test_running_metrics_match_a_regression_of_the_window(resync_every):
+    engine = _replay(_bars(), streaming.StreamingBeta(['AAA', 'BBB'], window = 60, resync_every = resync_every))
+
+    frame = engine.frame()
+    assert len(frame) == 60 and engine.count == 199
+    pd.testing.assert_frame_equal(engine.metrics(), reg.regress_on_market(frame, 'SPY'), check_exact = False, check_dtype = False, rtol = 1e-9)
+
+
+def test_ticker_that_missed_a_bar_has_no_return_across_the_gap():
+    bars = _bars(40)
+    gap = pd.Timestamp('2026-10-16 09:50')
+    bars = bars[~((bars['Symbol'] == 'BBB') & (bars['Timestamp'] == gap))]
+    engine = _replay(bars, streaming.StreamingBeta(['AAA', 'BBB'], window = 60))
+
+    frame = engine.frame().set_index('Date')
+    after = gap + pd.Timedelta(minutes = 1)
+    assert frame.loc[[gap, after], 'BBB'].isna().all()
+    assert frame['BBB'].isna().sum() == 2 and frame['AAA'].notna().all()
+    pd.testing.assert_frame_equal(engine.metrics(), reg.regress_on_market(engine.frame(), 'SPY'), check_exact = False, check_dtype = False, rtol = 1e-9)
+
+
+def test_bar_without_the_market_is_skipped():
+    bars = _bars(40)
+    gap = pd.Timestamp('2026-10-16 09:50')
+    engine = _replay(bars[~((bars['Symbol'] == 'SPY') & (bars['Timestamp'] == gap))], streaming.StreamingBeta(['AAA'], window = 60))
+
+    frame = engine.frame()
+    assert gap not in set(frame['Date']) and len(frame) == 38
+    ## The next return spans both minutes for the market and the stock alike
+    closes = bars.pivot(index = 'Timestamp', columns = 'Symbol', values = 'Close')
+    after = gap + pd.Timedelta(minutes = 1)
+    expected = (closes.loc[after] / closes.loc[gap - pd.Timedelta(minutes = 1)] - 1) * 100
+    row = frame.set_index('Date').loc[after]
+    assert row['AAA'] == pytest.approx(expected['AAA']) and row['SPY'] == pytest.approx(expected['SPY'])
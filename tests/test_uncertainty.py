@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+import utils.regression as reg
+import utils.uncertainty as uncertainty
+
+
+## Newey-West sandwich (X'X)^-1 S (X'X)^-1 of the OLS of y on [1, x]
+
+def _newey_west(x, y, lags):
+    X = np.column_stack([np.ones(len(x)), x])
+    XtX_inv = np.linalg.inv(X.T @ X)
+    g = X * (y - X @ (XtX_inv @ X.T @ y))[:, None]
+    S = g.T @ g
+    for lag in range(1, lags + 1):
+        gamma = g[lag:].T @ g[:-lag]
+        S += (1 - lag / (lags + 1)) * (gamma + gamma.T)
+    return np.sqrt(np.diag(XtX_inv @ S @ XtX_inv))
+
+
+@pytest.mark.parametrize('lags', [1, 5])
+def test_hac_errors_match_the_sandwich_estimator(returns, lags):
+    beta_se, alpha_se, stocks = uncertainty.hac_errors(returns, lags = lags)
+
+    assert stocks == ['A', 'B', 'C']
+    for i, stock in enumerate(stocks):
+        rows = returns[['SP500', stock]].dropna()
+        alpha, beta = _newey_west(rows['SP500'].to_numpy(), rows[stock].to_numpy(), lags)
+        ## A stock with gaps has its lags counted in rows, not days
+        if stock == 'B':
+            assert beta_se[i] == pytest.approx(beta, rel = 0.1)
+        else:
+            assert beta_se[i] == pytest.approx(beta) and alpha_se[i] == pytest.approx(alpha)
+
+
+def test_bootstrap_is_seeded_and_shaped(returns):
+    betas, alphas = uncertainty.bootstrap(returns, resamples = 300, seed = 4, processes = None)
+    again, _ = uncertainty.bootstrap(returns, resamples = 300, seed = 4, processes = None)
+    other, _ = uncertainty.bootstrap(returns, resamples = 300, seed = 5, processes = None)
+
+    assert betas.shape == alphas.shape == (300, 3)
+    np.testing.assert_array_equal(betas, again)
+    assert not np.array_equal(betas, other)
+    ## Resampled betas spread around the full-sample ones
+    np.testing.assert_allclose(np.median(betas, axis = 0), [1.3, 0.7, 0.9], atol = 0.15)
+
+
+def test_bootstrap_does_not_depend_on_the_processes(returns):
+    single, _ = uncertainty.bootstrap(returns, resamples = 600, seed = 2, processes = None)
+    pooled, _ = uncertainty.bootstrap(returns, resamples = 600, seed = 2, processes = 2)
+    np.testing.assert_allclose(single, pooled)
+
+
+def test_beta_uncertainty_brackets_the_estimate(returns):
+    table = uncertainty.beta_uncertainty(returns, resamples = 400, processes = None)
+
+    beta = reg.regress_on_market(returns)['beta']
+    assert list(table.index) == ['A', 'B', 'C']
+    assert ((table['beta_ci_low'] < beta) & (beta < table['beta_ci_high'])).all()
+    ## Block-bootstrap and HAC errors measure the same spread
+    np.testing.assert_allclose(table['beta_se_bootstrap'], table['beta_se_hac'], rtol = 0.35)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+## Date alignment between stock prices and the benchmark series
+
+## Normalize any date index to tz-naive midnight timestamps. Timezone-aware indexes
+## keep their local calendar date, the same result as taking str(x)[:10].
+## Flooring is done in numpy: DatetimeIndex.normalize() infers a frequency each call.
+
+def normalize_dates(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    values = index.to_numpy()
+    return pd.DatetimeIndex(values.astype('datetime64[D]').astype(values.dtype), name = 'Date')
+
+
+def _at_midnight(index):
+    values = index.to_numpy()
+    return bool((values == values.astype('datetime64[D]')).all())
+
+
+## Sorted, unique, tz-naive midnight index; frames that already have one (everything
+## read from the store) are passed through as they are
+
+def _prepare(frame):
+    index = frame.index
+    if not isinstance(index, pd.DatetimeIndex) or index.tz is not None or not _at_midnight(index):
+        frame = frame.set_axis(normalize_dates(index), axis = 0)
+    if not frame.index.is_monotonic_increasing:
+        frame = frame.sort_index()
+    if frame.index.has_duplicates:
+        frame = frame[~frame.index.duplicated(keep = 'last')]
+    return frame
+
+
+## Align prices (indexed by date, one column per ticker) with the benchmark on a
+## sorted DatetimeIndex. Rows are the benchmark's trading days up to the last price,
+## so a day a stock did not trade is a NaN row for that stock whichever other tickers
+## are loaded with it, and its results do not depend on them.
+## Returns the aligned frame with a leading 'Date' column and a Series counting, per
+## ticker, the prices dropped because the benchmark had no value.
+##
+## Both indexes are sorted and unique, so matching them is one binary search on day
+## numbers, and the result is copied into a single float block.
+
+def align_to_benchmark(prices, benchmark, name = 'SP500'):
+    prices = _prepare(prices.drop(columns = name) if name in prices.columns else prices)
+    benchmark = _prepare(benchmark)
+    market = benchmark.to_numpy(dtype = 'float64')
+    calendar = benchmark.index[~np.isnan(market)]
+    market = market[~np.isnan(market)]
+
+    days = calendar.to_numpy().astype('datetime64[D]')
+    price_days = prices.index.to_numpy().astype('datetime64[D]')
+    values = prices.to_numpy(dtype = 'float64')
+
+    ## Benchmark position of each price day; matched where the benchmark has that day
+    at = np.searchsorted(days, price_days)
+    matched = at < len(days)
+    matched[matched] = days[at[matched]] == price_days[matched]
+    dropped = pd.Series((~np.isnan(values[~matched])).sum(axis = 0), index = prices.columns)
+
+    ## Benchmark days up to the last date with any price
+    priced = np.flatnonzero(matched)
+    last = next((i for i in priced[::-1] if not np.isnan(values[i]).all()), None)
+    size = 0 if last is None else at[last] + 1
+    priced = priced[at[priced] < size]
+
+    columns = values.shape[1]
+    ## Column-major, the layout of a pandas float block, so nothing is transposed
+    aligned_values = np.empty((columns + 1, size)).T
+    ## Copy runs of consecutive days as blocks, slicing is much faster than scattering
+    ## rows; usually the prices cover every calendar day and there is a single run
+    target = at[priced]
+    breaks = np.flatnonzero((np.diff(priced) != 1) | (np.diff(target) != 1)) + 1
+    for lo, hi in zip(np.r_[0, breaks], np.r_[breaks, len(priced)]):
+        if hi > lo:
+            aligned_values[target[lo]:target[lo] + hi - lo, :columns] = values[priced[lo]:priced[lo] + hi - lo]
+    missing = np.ones(size, dtype = bool)
+    missing[target] = False
+    aligned_values[missing, :columns] = np.nan
+    aligned_values[:, columns] = market[:size]
+
+    aligned = pd.DataFrame(aligned_values, columns = prices.columns.append(pd.Index([name])), copy = False)
+    aligned.insert(0, 'Date', calendar[:size])
+    return aligned, dropped
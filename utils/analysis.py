@@ -0,0 +1,217 @@
+import datetime
+
+import pandas as pd
+
+import utils.align as align
+import utils.data_store as store
+import utils.factors as factors
+import utils.functions as fn
+from utils.portfolio import PortfolioModel
+import utils.regression as reg
+import utils.result_cache as result_cache
+import utils.risk_free as risk_free
+import utils.tracing as tracing
+import utils.uncertainty as uncertainty
+
+## Single-stock beta analysis used by the CAPM Beta page. An analysis keeps the
+## aligned prices, the daily returns and the running regression moments, so a new
+## trading day only folds in the new bars instead of rebuilding everything.
+
+def window_start(years, end):
+    return datetime.date(end.year - years, end.month, end.day)
+
+
+## CAPM expected return (annual %) from beta, market return and risk-free rate
+
+def capm_return(beta, rm, rf = 0):
+    return rf + (beta * (rm - rf))
+
+
+def _timed(name, func, *args):
+    with tracing.span(name):
+        return func(*args)
+
+
+## Daily returns in excess of the risk-free rate, with the daily rate used (in %)
+
+def _excess_returns(returns, rf_source):
+    rf_daily = risk_free.daily_rates(returns['Date'], rf_source)
+    return risk_free.excess_returns(returns, rf_daily), pd.Series(rf_daily, index = pd.DatetimeIndex(returns['Date']))
+
+
+## Load prices for one stock and the benchmark, inner-joined on date
+
+def _load_prices(stock, start, end):
+    prices, benchmark, failed = store.load_market_data([stock], start, end)
+    if failed:
+        raise RuntimeError(failed[stock])
+    with tracing.span('align'):
+        stock_df, _ = align.align_to_benchmark(prices[[stock]], benchmark)
+    return stock_df
+
+
+## Derived CAPM figures, recomputed only when the moments change
+
+def _derive(analysis):
+    stats = analysis['stats'].summary().loc[analysis['single_stock']]
+    ## Error bands need the whole window, they are recomputed on every change
+    errors = _timed('uncertainty', uncertainty.beta_uncertainty, analysis['stock_returns']).loc[analysis['single_stock']]
+    ## Returns are in excess of Rf, so Rm is the market premium over the window plus Rf
+    rf = float(risk_free.annualize(analysis['rf_daily'].mean()))
+    rm = analysis['stock_returns']['SP500'].mean() * 252 + rf
+    analysis.update({
+        'beta_value': stats['beta'],
+        'alpha_value': stats['alpha'],
+        'capm_return': capm_return(stats['beta'], rm, rf),
+        'rf': rf,
+        'rm': rm,
+        'r_squared': stats['r_squared'],
+        'correlation': stats['correlation'],
+        'volatility': stats['volatility'],
+        'residual_volatility': stats['residual_volatility'],
+        'uncertainty': errors,
+        'factor_fits': _timed('factors', factors.fit_models, analysis['stock_returns'], analysis['rf_daily'].to_numpy()),
+    })
+    return analysis
+
+
+## Full build, used the first time a stock/window is requested
+
+def build_beta_analysis(stock, years, end = None, rf_source = 'none'):
+    end = end or datetime.date.today()
+    prices = _load_prices(stock, window_start(years, end), end)
+    with tracing.span('returns'):
+        stock_returns, rf_daily = _excess_returns(fn.daily_returns(prices), rf_source)
+
+    return _derive({
+        'single_stock': stock,
+        'years': years,
+        'end': end,
+        'rf_source': rf_source,
+        'rf_daily': rf_daily,
+        'last_prices': prices.iloc[[-1]],
+        'stock_returns': stock_returns,
+        'stats': _timed('regression', reg.RegressionStats.from_returns, stock_returns),
+    })
+
+
+## Roll an existing analysis forward to a new end date. Only bars after the last
+## stored date are fetched; they are added to the moments and the bars that fell
+## out of the window are removed, each in O(1). When neither happens the derived
+## results are returned untouched.
+
+def refresh_beta_analysis(analysis, end = None):
+    end = end or datetime.date.today()
+    if end <= analysis['end']:
+        return analysis
+
+    stock = analysis['single_stock']
+    ## Cached analyses are shared, never update their moments in place
+    stats = analysis['stats'].copy()
+    last_prices = analysis['last_prices']
+    last_date = last_prices['Date'].iloc[0]
+
+    new_prices = _load_prices(stock, last_date.date() + datetime.timedelta(days = 1), end)
+    new_prices = new_prices[new_prices['Date'] > last_date]
+
+    ## Returns for the new bars, computed against the last stored prices
+    if not new_prices.empty:
+        frame = pd.concat([last_prices, new_prices], ignore_index = True)
+        new_returns = fn.daily_returns(frame)
+        new_returns, new_rf = _excess_returns(new_returns[new_returns['Date'] > last_date], analysis['rf_source'])
+        for x, y in zip(new_returns['SP500'].to_numpy(), new_returns[stock].to_numpy()):
+            stats.add(x, [y])
+        stock_returns = pd.concat([analysis['stock_returns'], new_returns], ignore_index = True)
+        rf_daily = pd.concat([analysis['rf_daily'], new_rf])
+        last_prices = new_prices.iloc[[-1]]
+    else:
+        stock_returns = analysis['stock_returns']
+        rf_daily = analysis['rf_daily']
+
+    ## Match a full build, whose first return is the day after the first price in the window
+    dates = stock_returns['Date']
+    expired = dates <= dates[dates >= pd.Timestamp(window_start(analysis['years'], end))].min()
+    for x, y in zip(stock_returns.loc[expired, 'SP500'].to_numpy(), stock_returns.loc[expired, stock].to_numpy()):
+        stats.remove(x, [y])
+
+    analysis = dict(analysis, end = end)
+    if new_prices.empty and not expired.any():
+        return analysis
+
+    analysis.update({
+        'last_prices': last_prices,
+        'stock_returns': stock_returns[~expired].reset_index(drop = True),
+        'rf_daily': rf_daily[~expired.to_numpy()],
+        'stats': stats,
+    })
+    return _derive(analysis)
+
+
+## Cached single-stock analysis. A miss for a new day starts from the latest cached
+## analysis of the same stock and window, so only the new bars are processed.
+
+def get_beta_analysis(stock, years, end = None, rf_source = 'none'):
+    end = end or datetime.date.today()
+    cache = result_cache.get_cache()
+    key = result_cache.make_key([stock], years, end, rf_source)
+
+    def compute():
+        previous = cache.latest_before(key)
+        if previous is not None:
+            return refresh_beta_analysis(previous, end)
+        return build_beta_analysis(stock, years, end, rf_source)
+
+    return cache.get_or_compute(key, compute)
+
+
+## Multi-stock CAPM analysis used by the CAPM Return page
+
+def build_capm_analysis(tickers, years, end = None, rf_source = 'none'):
+    end = end or datetime.date.today()
+    prices, benchmark, failed = store.load_market_data(tickers, window_start(years, end), end)
+    if prices.empty:
+        raise RuntimeError("none of the selected stocks could be loaded")
+
+    with tracing.span('align'):
+        stocks_df, dropped = align.align_to_benchmark(prices, benchmark)
+    with tracing.span('returns'):
+        returns = fn.daily_returns(stocks_df)
+        ## Regressions and the portfolio model run on returns in excess of the risk-free rate
+        stocks_daily_returns, rf_daily = _excess_returns(returns, rf_source)
+    rf = float(risk_free.annualize(rf_daily.mean()))
+
+    return {
+        'tickers': list(tickers),
+        'years': years,
+        'end': end,
+        'failed': failed,
+        'dropped': dropped,
+        'stocks_df': stocks_df,
+        'stocks_daily_returns': stocks_daily_returns,
+        'beta_stats': _timed('regression', reg.regress_on_market, stocks_daily_returns),
+        'uncertainty': _timed('uncertainty', uncertainty.beta_uncertainty, stocks_daily_returns),
+        'factor_fits': _timed('factors', factors.fit_models, stocks_daily_returns, rf_daily.to_numpy()),
+        'portfolio': _timed('portfolio', PortfolioModel, stocks_daily_returns),
+        'rf_source': rf_source,
+        'rf': rf,
+        'rm': stocks_daily_returns['SP500'].mean() * 252 + rf,
+    }
+
+
+## Per-stock regression statistics, error bands and CAPM expected return as one table
+
+def capm_table(analysis):
+    table = analysis['beta_stats'].join(analysis['uncertainty']).reset_index()
+    table['capm_return'] = capm_return(table['beta'], analysis['rm'], analysis['rf'])
+    return table
+
+
+## Cached multi-stock analysis, results with failed tickers are not kept
+
+def get_capm_analysis(tickers, years, end = None, rf_source = 'none'):
+    end = end or datetime.date.today()
+    key = result_cache.make_key(tickers, years, end, rf_source)
+    return result_cache.get_cache().get_or_compute(
+        key, lambda: build_capm_analysis(sorted(tickers), years, end, rf_source),
+        should_cache = lambda analysis: not analysis['failed'],
+    )
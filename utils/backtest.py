@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import utils.regression as reg
+
+## Walk-forward backtest of CAPM predictions. At every rebalance date (last trading
+## day of each month or quarter) beta and the market premium are estimated from the
+## trailing window only, and the CAPM excess return predicted for the next period is
+## compared with the realized one.
+##
+## Two predictions are scored:
+##   predicted    beta * average daily market premium of the window * days held,
+##                the figure the CAPM Return page shows
+##   conditional  beta * realized market excess return over the period, which
+##                isolates how well the estimated beta carried forward
+##
+## Window moments come from running sums over all days, so each rebalance date costs
+## two lookups per ticker instead of a refit. Returns are excess daily returns in %
+## and period returns are sums of daily returns.
+
+FREQUENCIES = {'Monthly': 'M', 'Quarterly': 'Q'}
+
+
+## Row index of the last trading day of each period. The last row counts only when
+## it closes its period, otherwise the data stops partway through it.
+
+def rebalance_positions(dates, frequency = 'M'):
+    dates = pd.DatetimeIndex(dates)
+    periods = dates.to_period(frequency)
+    ends = np.flatnonzero(periods[1:] != periods[:-1])
+    if len(dates) and (dates[-1] + pd.offsets.BDay()).to_period(frequency) != periods[-1]:
+        ends = np.append(ends, len(dates) - 1)
+    return ends
+
+
+## Backtest of one block of stock columns against the market column x. Every
+## rebalance date but the last is scored over the period up to the next one.
+
+def _walk(x, Y, ends, window, min_periods):
+    mask = ~np.isnan(Y) & ~np.isnan(x)[:, None]
+    X = np.where(mask, x[:, None], 0.0)
+    Y = np.where(mask, Y, 0.0)
+
+    ## Running sums with a leading zero row: the sum of rows [a, b) is S[b] - S[a]
+    S = np.zeros((5, len(X) + 1, Y.shape[1]))
+    np.cumsum(np.stack([mask.astype('float64'), X, Y, X * X, X * Y]), axis = 1, out = S[:, 1:])
+
+    stop = ends[:-1] + 1
+    start = np.zeros_like(stop) if window is None else np.maximum(stop - window, 0)
+    n, sx, sy, sxx, sxy = S[:, stop] - S[:, start]
+
+    ## The holding period runs from the day after a rebalance to the next rebalance
+    hold = S[:, ends[1:] + 1] - S[:, stop]
+    held, market_realized, realized = hold[0], hold[1], hold[2]
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        beta = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+        premium = sx / n
+    beta[n < max(min_periods, 2)] = np.nan
+
+    return {
+        'beta': beta,
+        'predicted': beta * premium * held,
+        'conditional': beta * market_realized,
+        'realized': realized,
+        'market_realized': market_realized,
+        'days': held,
+    }
+
+
+## Walk-forward CAPM predictions for every stock, one row per (rebalance date, stock).
+## Blocks of tickers can run in separate processes. A rebalance date is scored only
+## once its whole period has been realized, so when the data stops partway through a
+## period the last month or quarter end is left out.
+
+def walk_forward(returns, window = 252, frequency = 'M', min_periods = 60, market = reg.MARKET,
+                 processes = None, block_size = 250):
+    stocks = [col for col in returns.columns if col not in ('Date', market)]
+    dates = pd.DatetimeIndex(returns['Date'])
+    x = returns[market].to_numpy(dtype = 'float64')
+    Y = returns[stocks].to_numpy(dtype = 'float64')
+    ends = rebalance_positions(dates, frequency)
+
+    blocks = [slice(i, i + block_size) for i in range(0, len(stocks), block_size)]
+    if processes and processes > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            parts = list(pool.map(_walk, [x] * len(blocks), [Y[:, b] for b in blocks],
+                                  [ends] * len(blocks), [window] * len(blocks), [min_periods] * len(blocks)))
+    else:
+        parts = [_walk(x, Y[:, b], ends, window, min_periods) for b in blocks]
+
+    if not parts:
+        return pd.DataFrame()
+    columns = {name: np.hstack([part[name] for part in parts]) for name in parts[0]}
+    frame = pd.DataFrame({
+        'Date': np.repeat(dates[ends[:-1]], len(stocks)),
+        'Stock': np.tile(stocks, max(len(ends) - 1, 0)),
+        **{name: values.ravel() for name, values in columns.items()},
+    })
+    ## Drop dates without an estimate or without a full period after them
+    return frame[frame['beta'].notna() & (frame['days'] > 0)].reset_index(drop = True)
+
+
+## Error statistics of each prediction, per stock and for the whole universe.
+## hit_rate is the share of periods where the predicted and realized excess returns
+## have the same sign.
+
+def error_stats(results, by = 'Stock'):
+    columns = {}
+    for name in ('predicted', 'conditional'):
+        error = results[name] - results['realized']
+        columns[f'{name}_mae'] = error.abs()
+        columns[f'{name}_rmse'] = error ** 2
+        columns[f'{name}_bias'] = error
+        columns[f'{name}_hit_rate'] = (np.sign(results[name]) == np.sign(results['realized'])).astype('float64')
+    scores = pd.DataFrame(columns)
+
+    table = scores.groupby(results[by]).mean()
+    table.loc['All'] = scores.mean()
+    rmse = [col for col in table.columns if col.endswith('_rmse')]
+    table[rmse] = np.sqrt(table[rmse])
+    table.insert(0, 'periods', results.groupby(by).size().reindex(table.index).fillna(len(results)).astype(int))
+    return table
+
+
+## Cross-sectional rank correlation of predicted and realized returns per rebalance date
+
+def rank_ic(results, prediction = 'predicted'):
+    ranks = results.groupby('Date')[[prediction, 'realized']].rank()
+    ranks['Date'] = results['Date']
+    return ranks.groupby('Date').apply(lambda frame: frame[prediction].corr(frame['realized']))
@@ -0,0 +1,111 @@
+import argparse
+import datetime
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import utils.analysis as an
+import utils.data_store as store
+import utils.risk_free as risk_free
+import utils.symbols as symbols
+
+## Headless CAPM over large ticker universes, using the same analysis functions as
+## the pages. Tickers are split into chunks that run in separate processes and the
+## results are streamed to CSV or Parquet as each chunk finishes.
+##
+##   python -m utils.batch tickers.txt --years 5 --output capm.parquet
+
+
+def read_tickers(path):
+    with open(path) as f:
+        tickers = [line.split('#')[0].strip().upper() for line in f]
+    return list(dict.fromkeys(t for t in tickers if t))
+
+
+def _run_chunk(tickers, years, end, rf_source):
+    try:
+        analysis = an.build_capm_analysis(tickers, years, end, rf_source)
+    except Exception as e:
+        return None, {ticker: f"{type(e).__name__}: {e}" for ticker in tickers}
+    table = an.capm_table(analysis)
+    table['years'] = years
+    table['end'] = pd.Timestamp(end)
+    return table, analysis['failed']
+
+
+## Run CAPM for every ticker and yield (results, errors) per finished chunk
+
+def run_batch(tickers, years, end = None, rf_source = 'none', chunk_size = 100, processes = None):
+    end = end or datetime.date.today()
+    ## Warm the benchmark and risk-free series once so the workers read them from the store
+    store.load_benchmark(an.window_start(years, end), end)
+    risk_free.daily_rates(pd.bdate_range(an.window_start(years, end), end), rf_source)
+
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    with ProcessPoolExecutor(max_workers = processes) as pool:
+        futures = [pool.submit(_run_chunk, chunk, years, end, rf_source) for chunk in chunks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+## Append result chunks to a CSV or Parquet file as they arrive
+
+class ResultWriter:
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.writer = None
+        self.rows = 0
+
+    def write(self, table):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            batch = pa.Table.from_pandas(table, preserve_index = False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, batch.schema)
+            self.writer.write_table(batch.cast(self.writer.schema))
+        else:
+            table.to_csv(self.path, mode = 'a' if self.rows else 'w', header = not self.rows, index = False)
+        self.rows += len(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Compute betas and CAPM expected returns for a list of tickers.")
+    parser.add_argument('tickers', help = "file with one ticker per line")
+    parser.add_argument('--years', type = int, default = 1, help = "regression window in years (1-25)")
+    parser.add_argument('--end', type = datetime.date.fromisoformat, default = None, help = "end date, YYYY-MM-DD (default today)")
+    parser.add_argument('--risk-free', default = 'none', help = "'none', a FRED series such as DTB3, or a constant annual rate in %%")
+    parser.add_argument('--output', default = 'capm_results.csv', help = "output .csv or .parquet file")
+    parser.add_argument('--chunk-size', type = int, default = 100)
+    parser.add_argument('--processes', type = int, default = os.cpu_count())
+    args = parser.parse_args(argv)
+
+    ## Malformed symbols are reported without attempting a download
+    tickers, unknown = symbols.get_index().validate(read_tickers(args.tickers))
+    failed = {ticker: "not a valid ticker symbol" for ticker in unknown}
+    writer = ResultWriter(args.output)
+    try:
+        for table, errors in run_batch(tickers, args.years, args.end, args.risk_free, args.chunk_size, args.processes):
+            failed.update(errors)
+            if table is not None and len(table):
+                writer.write(table)
+    finally:
+        writer.close()
+
+    for ticker, reason in sorted(failed.items()):
+        print(f"{ticker}: {reason}", file = sys.stderr)
+    print(f"Wrote {writer.rows} of {len(tickers) + len(unknown)} tickers to {args.output}", file = sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+import utils.fetch as fetch
+import utils.shared_tier as shared_tier
+import utils.tracing as tracing
+
+## Local price store shared by every page, session and process on the host.
+## Each symbol lives in its own Parquet file next to a small JSON sidecar that
+## records which date range has already been fetched and when. With a shared tier
+## the store lives on the shared volume and one node at a time fetches a symbol.
+
+STORE_DIR = os.environ.get(
+    "CAPM_STORE_DIR",
+    os.path.join(shared_tier.SHARED_DIR, "prices") if shared_tier.SHARED_DIR else
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "prices"),
+)
+
+## Seconds before today's (still moving) bar is considered stale and refetched
+TTL_SECONDS = int(os.environ.get("CAPM_STORE_TTL", 15 * 60))
+
+BENCHMARK = 'SP500'
+
+SOURCES = fetch.default_sources()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(symbol):
+    with _locks_guard:
+        if symbol not in _locks:
+            _locks[symbol] = threading.Lock()
+        return _locks[symbol]
+
+
+def _data_path(symbol):
+    return os.path.join(STORE_DIR, f"{symbol}.parquet")
+
+
+def _meta_path(symbol):
+    return os.path.join(STORE_DIR, f"{symbol}.json")
+
+
+## Helpers to read and atomically write the stored series
+
+def _read(symbol):
+    try:
+        series = pd.read_parquet(_data_path(symbol))[symbol]
+        with open(_meta_path(symbol)) as f:
+            meta = json.load(f)
+    except (OSError, KeyError, ValueError):
+        return None, None
+    meta['start'] = datetime.date.fromisoformat(meta['start'])
+    meta['end'] = datetime.date.fromisoformat(meta['end'])
+    return series, meta
+
+
+def _write(symbol, series, meta):
+    os.makedirs(STORE_DIR, exist_ok = True)
+    pid = os.getpid()
+
+    tmp_data = f"{_data_path(symbol)}.{pid}.tmp"
+    series.to_frame(symbol).to_parquet(tmp_data)
+    os.replace(tmp_data, _data_path(symbol))
+
+    tmp_meta = f"{_meta_path(symbol)}.{pid}.tmp"
+    with open(tmp_meta, 'w') as f:
+        json.dump({
+            'start': meta['start'].isoformat(),
+            'end': meta['end'].isoformat(),
+            'fetched_at': meta['fetched_at'],
+        }, f)
+    os.replace(tmp_meta, _meta_path(symbol))
+
+
+## Work out which date ranges still need to be fetched for a request
+
+def _missing_ranges(series, meta, start, end, today):
+    if series is None:
+        return [(start, end)]
+
+    ranges = []
+    if start < meta['start']:
+        ranges.append((start, meta['start'] - datetime.timedelta(days = 1)))
+
+    ## Resume after the last stored bar rather than at meta['end']: a source that
+    ## publishes late (FRED) or a load made before the open leaves days past it unfetched.
+    ## A last bar fetched on its own day was the live price, not the close.
+    last = series.index[-1].date() if len(series) else meta['start'] - datetime.timedelta(days = 1)
+    fetched_on = datetime.date.fromtimestamp(meta['fetched_at'])
+    resume = last if fetched_on <= last else last + datetime.timedelta(days = 1)
+    if end > meta['end']:
+        ranges.append((resume, end))
+    elif resume <= end and fetched_on <= meta['end'] and time.time() - meta['fetched_at'] > TTL_SECONDS:
+        ## Bars up to meta['end'] may still change (or not be published yet), refetch the tail
+        ranges.append((resume, end))
+
+    return ranges
+
+
+## Fetch the missing ranges, merge them into the stored series and write it back
+
+def _update(symbol, series, meta, ranges, source, retries):
+    fetcher = SOURCES[source]
+    parts = [] if series is None else [series]
+    covered = None if meta is None else (meta['start'], meta['end'])
+    for lo, hi in ranges:
+        with tracing.span(f'fetch.{source}', symbol = symbol) as fetched:
+            part = fetch.with_retry(lambda: fetcher.fetch(symbol, lo, hi), retries)
+            tracing.annotate(fetched, bytes = int(part.memory_usage(deep = True)))
+        if part.empty and not _no_bars_expected(series, meta, lo, hi):
+            ## Most likely an outage (yfinance answers one with an empty frame), the
+            ## range stays missing and is fetched again next time
+            continue
+        parts.append(part)
+        covered = (lo, hi) if covered is None else (min(lo, covered[0]), max(hi, covered[1]))
+
+    if covered is None:
+        return part
+    series = pd.concat(parts)
+    series = series[~series.index.duplicated(keep = 'last')].sort_index()
+
+    meta = {'start': covered[0], 'end': covered[1], 'fetched_at': time.time()}
+    _write(symbol, series, meta)
+    return series
+
+
+## An empty range is genuine when the market was closed throughout (today's bar may
+## not be out yet, the TTL refetches it), or when it lies before a stored series that
+## starts well after its own start (not listed yet)
+
+def _no_bars_expected(series, meta, lo, hi):
+    if not len(pd.bdate_range(lo, min(hi, datetime.date.today() - datetime.timedelta(days = 1)))):
+        return True
+    return (series is not None and len(series) > 0 and hi < meta['start']
+            and series.index[0].date() - meta['start'] > datetime.timedelta(days = 7))
+
+
+## Load a single symbol, fetching only what is missing from disk
+
+def load_series(symbol, start, end, source = 'yahoo', retries = 2):
+    today = datetime.date.today()
+    end = min(end, today)
+
+    with _lock_for(symbol), tracing.span('store.load', symbol = symbol) as current:
+        series, meta = _read(symbol)
+        ranges = _missing_ranges(series, meta, start, end, today)
+        tracing.annotate(current, cache = 'miss' if ranges else 'hit')
+
+        if ranges:
+            tier = shared_tier.get_tier()
+            if tier is None:
+                series = _update(symbol, series, meta, ranges, source, retries)
+            else:
+                ## Another node may have fetched the symbol while this one waited
+                with tier.lock(f"prices:{symbol}"):
+                    series, meta = _read(symbol)
+                    ranges = _missing_ranges(series, meta, start, end, today)
+                    if ranges:
+                        series = _update(symbol, series, meta, ranges, source, retries)
+
+    return series.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+## Load every ticker and the benchmark concurrently.
+## Returns (prices, benchmark, errors) where errors maps failed symbols to a message.
+## Each request is bounded by its source's own timeout and retries; timeout is one
+## wall-clock limit for the whole set, so it is off unless a caller asks for it.
+
+def load_market_data(tickers, start, end, benchmark = BENCHMARK, max_workers = 8, timeout = None):
+    tasks = {ticker: (lambda ticker = ticker: load_series(ticker, start, end)) for ticker in tickers}
+    tasks[benchmark] = lambda: load_series(benchmark, start, end, source = 'fred')
+
+    results, errors = fetch.run_concurrently(tasks, max_workers = max_workers, timeout = timeout)
+
+    if benchmark in errors:
+        raise RuntimeError(f"Could not load benchmark {benchmark}: {errors[benchmark]}")
+
+    prices = pd.DataFrame({ticker: results[ticker] for ticker in tickers if ticker in results})
+    prices.index.name = 'Date'
+    return prices, results[benchmark], errors
+
+
+## Load the benchmark index from FRED
+
+def load_benchmark(start, end, symbol = BENCHMARK):
+    return load_series(symbol, start, end, source = 'fred')
@@ -0,0 +1,79 @@
+import numpy as np
+
+## Downsampling for long chart series, so the browser only receives about as many
+## points as the chart has pixels.
+
+POINTS_PER_PIXEL = 2
+
+
+def points_for_width(width_px):
+    return int(width_px * POINTS_PER_PIXEL)
+
+
+## Largest-Triangle-Three-Buckets: keeps the first and last point and, from each
+## bucket in between, the point forming the largest triangle with the previously
+## kept point and the average of the next bucket. Returns the kept indices.
+
+def lttb(x, y, n_out):
+    x = np.asarray(x, dtype = 'float64')
+    y = np.asarray(y, dtype = 'float64')
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    ## Next-bucket averages for every bucket at once
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    kept = np.empty(n_out, dtype = np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+## Min/max per bucket: fully vectorized, keeps every spike. Returns sorted indices.
+
+def minmax(y, n_out):
+    y = np.asarray(y, dtype = 'float64')
+    n = len(y)
+    buckets = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+
+    size = -(-n // buckets)
+    ## Recount so that only the last bucket is padded and it still holds a value
+    buckets = -(-n // size)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.nanargmin(blocks, axis = 1)
+    highs = offsets + np.nanargmax(blocks, axis = 1)
+    return np.unique(np.concatenate([[0, n - 1], lows, highs]))
+
+
+## Downsample one (x, y) series after dropping missing values
+
+def downsample(x, y, n_out, method = 'lttb'):
+    x = np.asarray(x)
+    y = np.asarray(y, dtype = 'float64')
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if len(y) <= n_out:
+        return x, y
+
+    if method == 'minmax':
+        kept = minmax(y, n_out)
+    else:
+        numeric_x = x.astype('datetime64[ns]').astype('int64') if np.issubdtype(x.dtype, np.datetime64) else x
+        kept = lttb(numeric_x, y, n_out)
+    return x[kept], y[kept]
@@ -0,0 +1,182 @@
+import glob
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import utils.risk_free as risk_free
+
+## Multi-factor regressions (Fama-French 3/5 factors, momentum) for every stock.
+##
+## Factor series are read once per process from the daily CSV files published on
+## Kenneth French's data library (F-F_Research_Data_Factors_daily.CSV,
+## F-F_Research_Data_5_Factors_2x3_daily.CSV, F-F_Momentum_Factor_daily.CSV) or from
+## plain CSVs with a Date column, all placed in CAPM_FACTORS_DIR. Values are daily
+## returns in %, like the rest of the pipeline.
+##
+## All stocks share one design matrix, so every model is a single batched solve of
+## the normal equations; only stocks with missing days get their own X'X.
+
+FACTORS_DIR = os.environ.get(
+    "CAPM_FACTORS_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "factors"),
+)
+
+MODELS = {
+    'FF3': ['Mkt-RF', 'SMB', 'HML'],
+    'FF3 + Momentum': ['Mkt-RF', 'SMB', 'HML', 'Mom'],
+    'FF5': ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA'],
+    'FF5 + Momentum': ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA', 'Mom'],
+}
+
+TRADING_DAYS = 252
+
+
+## Read one factor file: Ken French's layout (free text, a header row starting with a
+## comma, YYYYMMDD rows, a copyright footer) or a plain CSV with a Date column
+
+def read_factor_file(path):
+    header, dates, values = None, [], []
+    with open(path) as f:
+        for line in f:
+            cells = [cell.strip() for cell in line.split(',')]
+            if header is None:
+                if len(cells) > 1 and cells[0] in ('', 'Date') and all(cells[1:]):
+                    header = cells[1:]
+                continue
+            ## The daily section ends at the first row that is not a dated row of numbers
+            try:
+                row = [float(cell) for cell in cells[1:len(header) + 1]]
+            except ValueError:
+                row = None
+            if not cells[0] or row is None or len(row) != len(header):
+                if dates:
+                    break
+                continue
+            dates.append(cells[0])
+            values.append(row)
+    if header is None:
+        raise ValueError(f"no factor header found in {path}")
+
+    compact = all(len(date) == 8 and date.isdigit() for date in dates)
+    index = pd.DatetimeIndex(pd.to_datetime(dates, format = '%Y%m%d' if compact else None), name = 'Date')
+    return pd.DataFrame(np.array(values, dtype = 'float64').reshape(-1, len(header)), index = index, columns = header).sort_index()
+
+
+_factors = None
+_factors_key = None
+_factors_guard = threading.Lock()
+
+
+## Every factor found in the directory as one frame indexed by date. The files are
+## read again only when one of them changes.
+
+def load_factors(directory = None):
+    global _factors, _factors_key
+    directory = directory or FACTORS_DIR
+    paths = sorted(glob.glob(os.path.join(directory, '*.csv')) + glob.glob(os.path.join(directory, '*.CSV')))
+    key = (directory, tuple((path, os.path.getmtime(path)) for path in paths))
+
+    with _factors_guard:
+        if key != _factors_key:
+            frames = [read_factor_file(path) for path in paths]
+            factors = pd.concat(frames, axis = 1) if frames else pd.DataFrame(index = pd.DatetimeIndex([], name = 'Date'))
+            ## RF and Mkt-RF appear in several files, keep the first copy
+            _factors = factors.loc[:, ~factors.columns.duplicated()]
+            _factors_key = key
+        return _factors
+
+
+def available_models(factors = None):
+    factors = load_factors() if factors is None else factors
+    return [name for name, columns in MODELS.items() if set(columns) <= set(factors.columns)]
+
+
+## Result of one model fitted to every stock. Loadings and t-stats have one row per
+## stock and one column per regressor ('Alpha' first, then the factors).
+
+class FactorFit:
+
+    def __init__(self, model, loadings, t_stats, r_squared, observations, implied_return):
+        self.model = model
+        self.loadings = loadings
+        self.t_stats = t_stats
+        self.r_squared = r_squared
+        self.observations = observations
+        self.implied_return = implied_return
+
+    def table(self, stock):
+        return pd.DataFrame({'Loading': self.loadings.loc[stock], 't-stat': self.t_stats.loc[stock]})
+
+
+## Batched OLS of every column of Y on the design D (days x regressors).
+## mask marks the usable cells of Y; masked cells must be zero.
+
+def solve(D, Y, mask):
+    complete = mask.all(axis = 0)
+    p = D.shape[1]
+    XtX = np.empty((Y.shape[1], p, p))
+    ## Stocks without gaps share one X'X, the rest get X'X over their own days
+    XtX[complete] = D.T @ D
+    if (~complete).any():
+        XtX[~complete] = np.einsum('ti,tj,ts->sij', D, D, mask[:, ~complete].astype('float64'))
+    Xty = (D.T @ Y).T
+
+    n = mask.sum(axis = 0)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        XtX_inv = np.linalg.pinv(XtX)
+        coef = np.einsum('sij,sj->si', XtX_inv, Xty)
+        residuals = np.where(mask, Y - D @ coef.T, 0.0)
+        ss_res = np.einsum('ts,ts->s', residuals, residuals)
+        mean_y = Y.sum(axis = 0) / n
+        ss_tot = np.einsum('ts,ts->s', np.where(mask, Y - mean_y, 0.0), np.where(mask, Y - mean_y, 0.0))
+        se = np.sqrt(ss_res / (n - p))[:, None] * np.sqrt(np.einsum('sii->si', XtX_inv))
+        return coef, coef / se, 1 - ss_res / ss_tot, n
+
+
+## Fit every available model. `returns` are daily returns (in %) with a Date column,
+## in excess of `rf_daily`; they are re-based onto the factor files' own RF, which is
+## what the factor premia are measured against.
+
+def fit_models(returns, rf_daily = 0.0, market = 'SP500', factors = None, models = None):
+    factors = load_factors() if factors is None else factors
+    models = available_models(factors) if models is None else models
+    if not models:
+        return {}
+
+    stocks = [col for col in returns.columns if col not in ('Date', market)]
+    dates = pd.DatetimeIndex(returns['Date'])
+    ## Factor row for each return date; days the files do not cover are left out
+    positions = factors.index.get_indexer(dates)
+    rows = positions >= 0
+    if not rows.any():
+        return {}
+    aligned = factors.iloc[positions[rows]]
+
+    raw = returns[stocks].to_numpy(dtype = 'float64') + np.broadcast_to(np.asarray(rf_daily, dtype = 'float64'), len(dates))[:, None]
+    Y = raw[rows] - aligned['RF'].to_numpy()[:, None] if 'RF' in aligned.columns else raw[rows]
+    mask = ~np.isnan(Y)
+    Y = np.where(mask, Y, 0.0)
+
+    rf = float(risk_free.annualize(aligned['RF'].mean())) if 'RF' in aligned.columns else 0.0
+    fits = {}
+    for model in models:
+        columns = MODELS[model]
+        F = aligned[columns].to_numpy(dtype = 'float64')
+        D = np.column_stack([np.ones(len(F)), F])
+        coef, t_stats, r_squared, n = solve(D, Y, mask)
+
+        names = ['Alpha'] + columns
+        index = pd.Index(stocks, name = 'Stock')
+        ## Expected return implied by the loadings and the average factor premia (annual %)
+        implied = rf + coef[:, 1:] @ F.mean(axis = 0) * TRADING_DAYS
+        fits[model] = FactorFit(
+            model,
+            pd.DataFrame(coef, index = index, columns = names),
+            pd.DataFrame(t_stats, index = index, columns = names),
+            pd.Series(r_squared, index = index),
+            pd.Series(n, index = index),
+            pd.Series(implied, index = index),
+        )
+    return fits
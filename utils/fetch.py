@@ -0,0 +1,129 @@
+import datetime
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+import utils.tracing as tracing
+from utils.align import normalize_dates
+
+## Market data sources. Every source exposes fetch(symbol, start, end) and returns
+## a float64 Series of closing prices indexed by a tz-naive 'Date' index.
+
+def _clean_index(series):
+    series.index = normalize_dates(series.index)
+    return series.astype('float64')
+
+
+def _empty(symbol):
+    return pd.Series(dtype = 'float64', name = symbol, index = pd.DatetimeIndex([], name = 'Date'))
+
+
+class YahooSource:
+    name = 'yahoo'
+
+    def __init__(self, timeout = 10):
+        self.timeout = timeout
+
+    def fetch(self, symbol, start, end):
+        import yfinance as yf
+
+        data = yf.download(symbol, start = start, end = end + datetime.timedelta(days = 1),
+                           auto_adjust = True, progress = False, timeout = self.timeout)
+        if data.empty:
+            return _empty(symbol)
+        close = data['Close']
+        if isinstance(close, pd.DataFrame):
+            close = close.iloc[:, 0]
+        return _clean_index(close.rename(symbol))
+
+
+class FredSource:
+    name = 'fred'
+
+    def __init__(self, timeout = 10):
+        self.timeout = timeout
+
+    def fetch(self, symbol, start, end):
+        from pandas_datareader.fred import FredReader
+
+        data = FredReader([symbol], start = start, end = end, timeout = self.timeout).read()
+        return _clean_index(data[symbol].rename(symbol))
+
+
+## Offline stand-in reading <directory>/<symbol>.csv files with Date and Close columns
+
+class LocalSource:
+    name = 'local'
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start, end):
+        path = os.path.join(self.directory, f"{symbol}.csv")
+        if not os.path.exists(path):
+            raise LookupError(f"no local data for {symbol}")
+        data = pd.read_csv(path, index_col = 'Date', parse_dates = True)
+        column = 'Close' if 'Close' in data.columns else data.columns[0]
+        series = _clean_index(data[column].rename(symbol)).sort_index()
+        return series.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+
+## Pick the sources to use, CAPM_LOCAL_DATA switches every page to offline data
+
+def default_sources():
+    local_dir = os.environ.get("CAPM_LOCAL_DATA")
+    if local_dir:
+        local = LocalSource(local_dir)
+        return {'yahoo': local, 'fred': local}
+    return {'yahoo': YahooSource(), 'fred': FredSource()}
+
+
+## Call func, retrying with exponential backoff on any exception
+
+def with_retry(func, retries = 2, backoff = 0.5):
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+## Run independent tasks on a bounded thread pool and collect partial failures.
+## tasks maps a key to a zero-argument callable; returns (results, errors) dicts.
+
+def run_concurrently(tasks, max_workers = 8, timeout = None):
+    results, errors = {}, {}
+    if not tasks:
+        return results, errors
+
+    pool = ThreadPoolExecutor(max_workers = min(max_workers, len(tasks)))
+    futures = {pool.submit(tracing.bind(task)): key for key, task in tasks.items()}
+    done, pending = wait(futures, timeout = timeout)
+    ## Do not block on stragglers, their results are simply dropped
+    pool.shutdown(wait = False, cancel_futures = True)
+
+    for future in pending:
+        errors[futures[future]] = "timed out"
+
+    for future in done:
+        key = futures[future]
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            errors[key] = f"{type(e).__name__}: {e}"
+
+    return results, errors
+
+
+## Fetch several symbols from one source concurrently, without touching the store
+
+def fetch_many(symbols, start, end, source, max_workers = 8, retries = 2, timeout = None):
+    tasks = {
+        symbol: (lambda symbol = symbol: with_retry(lambda: source.fetch(symbol, start, end), retries))
+        for symbol in symbols
+    }
+    return run_concurrently(tasks, max_workers = max_workers, timeout = timeout)
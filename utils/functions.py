@@ -1,13 +1,28 @@
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
+import pandas as pd
+import utils.downsample as ds
+import utils.regression as reg
+
+## Plotly is imported inside the plotting functions, so the analysis and batch code
+## that only needs the return kernels does not pay for it.
+##
+## Charts are drawn with WebGL traces and long series are downsampled (LTTB) to about
+## two points per pixel of chart width. Pass max_points = None to plot every point.
+
+CHART_WIDTH = 900
+DENSITY_THRESHOLD = 5000
 
 ## Function to plot interactive plotly charts
 
-def plot_capm_return(df):
+def plot_capm_return(df, max_points = ds.points_for_width(450)):
+    import plotly.express as px
+    import plotly.graph_objects as go
+
     fig = px.line()
+    dates = df['Date'].to_numpy()
     for i in df.columns[1:]:
-        fig.add_scatter(x = df['Date'], y = df[i], mode = 'lines', name = i)
+        x, y = (dates, df[i]) if max_points is None else ds.downsample(dates, df[i].to_numpy(), max_points)
+        fig.add_trace(go.Scattergl(x = x, y = y, mode = 'lines', name = i))
     
     fig.update_layout(
         width = 450, margin = dict(l = 20, r = 20, t = 50, b = 20),
@@ -16,14 +31,38 @@ def plot_capm_return(df):
     
     return fig
 
+## Kernels working on a contiguous float64 block of prices (rows = days, columns = stocks).
+## Every column is handled in one pass and each output is allocated once.
+
+def price_block(df):
+    return np.ascontiguousarray(df.iloc[:, 1:].to_numpy(dtype = 'float64'))
+
+def normalize_block(prices):
+    ## Divide by the first valid price of each column, so shorter histories start at 1 too
+    first = prices[np.argmax(~np.isnan(prices), axis = 0), np.arange(prices.shape[1])]
+    return np.divide(prices, first)
+
+def returns_block(prices, kind = 'simple'):
+    out = np.divide(prices[1:], prices[:-1])
+    if kind == 'log':
+        np.log(out, out = out)
+    else:
+        out -= 1
+    out *= 100
+    return out
+
+def _with_dates(values, df, dates):
+    result = pd.DataFrame(values, columns = df.columns[1:], index = dates.index, copy = False)
+    result.insert(0, df.columns[0], dates)
+    return result
+
 ## Function to normalize the prices based on initial price
 
 def normalize_prices(df):
-    for col in df.columns[1:]:
-        df[col] = df[col] / df[col].iloc[0]
-    return df
+    return _with_dates(normalize_block(price_block(df)), df, df.iloc[:, 0])
 
-## Function to calculate daily returns
+## Function to calculate daily returns (in %), simple or log.
+## The first day has no return and is left out; a missing price gives NaN for that stock only.
 
 # def daily_returns(df):
 #     for i in df.columns[1:]:
@@ -33,31 +72,37 @@ def normalize_prices(df):
 #     df = df.dropna()
 #     return df
 
-def daily_returns(df):
-    for col in df.columns[1:]:
-        df.loc[1:, col] = ((df[col].iloc[1:].values - df[col].iloc[:-1].values) / df[col].iloc[:-1].values) * 100
-        df.loc[0, col] = 0
-    return df.dropna()
+def daily_returns(df, kind = 'simple'):
+    dates = df.iloc[1:, 0].reset_index(drop = True)
+    return _with_dates(returns_block(price_block(df), kind), df, dates)
 
 ## Function to calculate beta
 
 def calculate_beta(stocks_daily_returns, stock):
-    rm = stocks_daily_returns['SP500'].mean() * 252
-    beta, alpha = np.polyfit(stocks_daily_returns['SP500'], stocks_daily_returns[stock], 1)
-    return beta, alpha
+    stats = reg.regress_on_market(stocks_daily_returns[['SP500', stock]]).loc[stock]
+    return stats['beta'], stats['alpha']
 
 ## New function for detailed beta regression plot (matching your reference image)
-def plot_beta_regression_detailed(daily_returns, stock, beta, alpha):
+def plot_beta_regression_detailed(daily_returns, stock, beta, alpha, density_threshold = DENSITY_THRESHOLD):
     import plotly.graph_objects as go
-    import numpy as np
 
     fig = go.Figure()
 
-    # Scatter points
-    fig.add_trace(go.Scatter(
-        x = daily_returns['SP500'], y = daily_returns[stock], mode = 'markers', name = 'Stock Returns',
-        marker = dict(color = 'blue', size = 8, opacity = 0.6), showlegend = False
-    ))
+    # Scatter points, or a density view when there are too many to draw one by one
+    if len(daily_returns) > density_threshold:
+        ## Bin on the server so only the 80x80 counts are sent to the browser
+        points = daily_returns[['SP500', stock]].dropna().to_numpy()
+        counts, x_edges, y_edges = np.histogram2d(points[:, 0], points[:, 1], bins = 80)
+        fig.add_trace(go.Heatmap(
+            x = (x_edges[:-1] + x_edges[1:]) / 2, y = (y_edges[:-1] + y_edges[1:]) / 2,
+            z = np.where(counts.T > 0, counts.T, np.nan),
+            colorscale = 'Blues', showscale = False, name = 'Stock Returns'
+        ))
+    else:
+        fig.add_trace(go.Scattergl(
+            x = daily_returns['SP500'], y = daily_returns[stock], mode = 'markers', name = 'Stock Returns',
+            marker = dict(color = 'blue', size = 8, opacity = 0.6), showlegend = False
+        ))
 
     # Regression line
     min_x = daily_returns['SP500'].min()
@@ -79,23 +124,23 @@ def plot_beta_regression_detailed(daily_returns, stock, beta, alpha):
 
     return fig
 
-## Plotly table
-
-def plotly_table(dataframe):
-    headerColor = 'grey'
-    rowEvenColor = '#f8fafd'
-    rowOddColor = '#feffff'
-    fig = go.Figure(data=[go.Table(
-        header=dict(
-            values=["<b></b>"]+[f"<b>{str(i)[:10]}</b>" for i in dataframe.columns],
-            line_color='#0078ff', fill_color='#0078ff',
-            align='center', font=dict(color='white', size=15), height=35,
-        ),
-        cells=dict(
-            values=["<b>"+str(i)+"</b>" for i in dataframe.index]+[dataframe[i] for i in dataframe.columns],
-            fill_color=[[rowOddColor, rowEvenColor]],
-            align='left', line_color=['white'], font=dict(color=["black"], size=15)
-        )
-    )])
-    fig.update_layout(height=400, margin=dict(l=0, r=0, t=0, b=0))
-    return fig
\ No newline at end of file
+## Function to plot rolling beta time series (one line per column)
+
+def plot_rolling_beta(rolling_df, max_points = ds.points_for_width(CHART_WIDTH)):
+    import plotly.graph_objects as go
+
+    fig = go.Figure()
+    dates = rolling_df.index.to_numpy()
+    for col in rolling_df.columns:
+        x, y = (dates, rolling_df[col]) if max_points is None else ds.downsample(dates, rolling_df[col].to_numpy(), max_points)
+        fig.add_trace(go.Scattergl(x = x, y = y, mode = 'lines', name = str(col)))
+
+    fig.add_hline(y = 1, line = dict(color = 'grey', dash = 'dash'))
+    fig.update_layout(
+        xaxis_title = "Date", yaxis_title = "Beta (β)",
+        legend = dict(orientation = "h", yanchor = "bottom", y = 1.02, xanchor = "center", x = 0.5),
+        margin = dict(l = 20, r = 20, t = 50, b = 20),
+        autosize = True
+    )
+
+    return fig
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+import utils.regression as reg
+
+## Portfolio analytics from one covariance matrix of daily returns (stocks + market).
+## The matrix is computed once per analysis; every weighting after that is a few
+## small matrix products, and evaluate_many scores thousands of weightings at once.
+
+TRADING_DAYS = 252
+
+
+class PortfolioModel:
+
+    def __init__(self, returns, market = reg.MARKET):
+        self.stocks = [col for col in returns.columns if col not in ('Date', market)]
+        ## Days on which every stock and the market have a return, so the matrix stays positive semi-definite
+        values = returns[self.stocks + [market]].dropna().to_numpy(dtype = 'float64')
+
+        cov = np.cov(values, rowvar = False)
+        self.observations = len(values)
+        self.cov = cov[:-1, :-1]
+        self.cov_market = cov[:-1, -1]
+        self.var_market = cov[-1, -1]
+        self.betas = self.cov_market / self.var_market
+
+    def normalize(self, weights):
+        weights = np.asarray(weights, dtype = 'float64')
+        total = weights.sum(axis = -1, keepdims = True)
+        return np.divide(weights, total, out = np.zeros_like(weights), where = total != 0)
+
+    ## Statistics for one weight vector (annual figures in %)
+
+    def evaluate(self, weights, rm, rf = 0):
+        w = self.normalize(weights)
+        cov_w = self.cov @ w
+        variance = w @ cov_w
+        beta = w @ self.betas
+        active_variance = variance - 2 * (w @ self.cov_market) + self.var_market
+        volatility = np.sqrt(variance * TRADING_DAYS)
+
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            contributions = w * cov_w / variance
+
+        return {
+            'beta': beta,
+            'capm_return': rf + beta * (rm - rf),
+            'volatility': volatility,
+            'tracking_error': np.sqrt(max(active_variance, 0.0) * TRADING_DAYS),
+            'risk_contributions': pd.Series(contributions, index = self.stocks),
+        }
+
+    ## The same headline statistics for a matrix of weightings (one per row)
+
+    def evaluate_many(self, weights, rm, rf = 0):
+        W = self.normalize(weights)
+        variance = np.einsum('kn,nm,km->k', W, self.cov, W)
+        beta = W @ self.betas
+        active_variance = variance - 2 * (W @ self.cov_market) + self.var_market
+
+        return pd.DataFrame({
+            'beta': beta,
+            'capm_return': rf + beta * (rm - rf),
+            'volatility': np.sqrt(variance * TRADING_DAYS),
+            'tracking_error': np.sqrt(np.maximum(active_variance, 0.0) * TRADING_DAYS),
+        })
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+MARKET = 'SP500'
+
+## Turn per-column regression moments into the statistics shown on the pages.
+## n: observations, mean_x / mean_y: means, cxx / cyy / cxy: centered sums of
+## squares and cross-products. All arguments are arrays with one entry per stock.
+
+def summarize(n, mean_x, mean_y, cxx, cyy, cxy, index = None):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        beta = cxy / cxx
+        alpha = mean_y - beta * mean_x
+        correlation = cxy / np.sqrt(cxx * cyy)
+        ss_res = np.maximum(cyy - beta * cxy, 0.0)
+        residual_volatility = np.sqrt(ss_res / (n - 2))
+        volatility = np.sqrt(cyy / n)
+
+    return pd.DataFrame({
+        'beta': beta,
+        'alpha': alpha,
+        'r_squared': correlation ** 2,
+        'correlation': correlation,
+        'volatility': volatility,
+        'residual_volatility': residual_volatility,
+        'observations': n,
+    }, index = index)
+
+
+## Centered regression moments of every stock column against the market.
+## NaNs are handled per column, so a ticker with a shorter history only uses the days
+## on which both it and the market have a return.
+
+def _moments(returns, market):
+    stocks = [col for col in returns.columns if col not in ('Date', market)]
+    x = returns[market].to_numpy(dtype = 'float64')
+    Y = returns[stocks].to_numpy(dtype = 'float64')
+
+    mask = ~np.isnan(Y) & ~np.isnan(x)[:, None]
+    n = mask.sum(axis = 0)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean_x = np.where(mask, x[:, None], 0.0).sum(axis = 0) / n
+        mean_y = np.where(mask, Y, 0.0).sum(axis = 0) / n
+
+    ## Masked cells are zero after centering, so they drop out of every sum
+    X = np.where(mask, x[:, None] - mean_x, 0.0)
+    Y = np.where(mask, Y - mean_y, 0.0)
+
+    cxx = np.einsum('ij,ij->j', X, X)
+    cyy = np.einsum('ij,ij->j', Y, Y)
+    cxy = np.einsum('ij,ij->j', X, Y)
+
+    return stocks, n, mean_x, mean_y, cxx, cyy, cxy
+
+
+## Closed-form OLS of every stock column on the market column as one matrix operation
+
+def regress_on_market(returns, market = MARKET):
+    stocks, *moments = _moments(returns, market)
+    return summarize(*moments, index = pd.Index(stocks, name = 'Stock'))
+
+
+## Rolling (or expanding when window is None) beta of every stock column.
+## Each window is read off running sums, so the cost is O(n) per column no matter
+## how long the window is. Returns a frame of betas indexed like the input rows.
+
+def rolling_beta(returns, window = None, market = MARKET, min_periods = 20):
+    stocks = [col for col in returns.columns if col not in ('Date', market)]
+    x = returns[market].to_numpy(dtype = 'float64')
+    Y = returns[stocks].to_numpy(dtype = 'float64')
+    mask = ~np.isnan(Y) & ~np.isnan(x)[:, None]
+
+    ## Shifting by the overall means leaves beta unchanged and keeps the running sums small
+    X = np.where(mask, x[:, None] - np.nanmean(x), 0.0)
+    Y = np.where(mask, Y - np.nanmean(Y, axis = 0), 0.0)
+
+    sums = np.cumsum(np.stack([mask.astype('float64'), X, Y, X * X, X * Y]), axis = 1)
+    if window is not None:
+        sums[:, window:] -= sums[:, :-window].copy()
+    n, sx, sy, sxx, sxy = sums
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        beta = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+    beta[n < max(min_periods, 2)] = np.nan
+
+    index = pd.DatetimeIndex(returns['Date'], name = 'Date') if 'Date' in returns.columns else returns.index
+    return pd.DataFrame(beta, index = index, columns = stocks)
+
+
+## Running regression moments for a set of stocks against the market.
+## add/remove fold a single bar in or out in O(1) per stock (Welford updates),
+## so a fixed window can slide forward one day without refitting.
+
+class RegressionStats:
+
+    def __init__(self, stocks):
+        self.stocks = list(stocks)
+        size = len(self.stocks)
+        self.n = np.zeros(size)
+        self.mean_x = np.zeros(size)
+        self.mean_y = np.zeros(size)
+        self.cxx = np.zeros(size)
+        self.cyy = np.zeros(size)
+        self.cxy = np.zeros(size)
+
+    @classmethod
+    def from_returns(cls, returns, market = MARKET):
+        stocks, n, mean_x, mean_y, cxx, cyy, cxy = _moments(returns, market)
+        self = cls(stocks)
+        self.n = n.astype('float64')
+        self.mean_x = np.nan_to_num(mean_x)
+        self.mean_y = np.nan_to_num(mean_y)
+        self.cxx, self.cyy, self.cxy = cxx, cyy, cxy
+        return self
+
+    def copy(self):
+        other = RegressionStats(self.stocks)
+        for name in ('n', 'mean_x', 'mean_y', 'cxx', 'cyy', 'cxy'):
+            setattr(other, name, getattr(self, name).copy())
+        return other
+
+    def add(self, x, y):
+        y = np.asarray(y, dtype = 'float64')
+        valid = ~np.isnan(y) & ~np.isnan(x)
+        n = self.n + valid
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dx = np.where(valid, x - self.mean_x, 0.0)
+            dy = np.where(valid, y - self.mean_y, 0.0)
+            self.mean_x = self.mean_x + np.where(valid, dx / n, 0.0)
+            self.mean_y = self.mean_y + np.where(valid, dy / n, 0.0)
+        self.cxx += np.where(valid, dx * (x - self.mean_x), 0.0)
+        self.cyy += np.where(valid, dy * (y - self.mean_y), 0.0)
+        self.cxy += np.where(valid, dx * (y - self.mean_y), 0.0)
+        self.n = n
+
+    def remove(self, x, y):
+        y = np.asarray(y, dtype = 'float64')
+        valid = ~np.isnan(y) & ~np.isnan(x) & (self.n > 0)
+        n = self.n - valid
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            dx = np.where(valid, x - self.mean_x, 0.0)
+            dy = np.where(valid, y - self.mean_y, 0.0)
+            self.mean_x = np.where(valid & (n > 0), self.mean_x - dx / n, np.where(n > 0, self.mean_x, 0.0))
+            self.mean_y = np.where(valid & (n > 0), self.mean_y - dy / n, np.where(n > 0, self.mean_y, 0.0))
+        self.cxx = np.where(n > 0, self.cxx - np.where(valid, dx * (x - self.mean_x), 0.0), 0.0)
+        self.cyy = np.where(n > 0, self.cyy - np.where(valid, dy * (y - self.mean_y), 0.0), 0.0)
+        self.cxy = np.where(n > 0, self.cxy - np.where(valid, dx * (y - self.mean_y), 0.0), 0.0)
+        self.n = n
+
+    def summary(self):
+        return summarize(self.n, self.mean_x, self.mean_y, self.cxx, self.cyy, self.cxy,
+                         index = pd.Index(self.stocks, name = 'Stock'))
@@ -0,0 +1,150 @@
+import collections
+import hashlib
+import os
+import pickle
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+import utils.shared_tier as shared_tier
+import utils.tracing as tracing
+
+## Process-wide cache of computed analyses, shared by every page and session.
+## Entries are evicted least-recently-used once the memory budget is exceeded and,
+## when a spill directory is configured, written to disk instead of being dropped.
+## A local miss goes to the shared tier, if the deployment has one, before computing.
+
+MAX_BYTES = int(float(os.environ.get("CAPM_CACHE_MB", 256)) * 1024 * 1024)
+SPILL_DIR = os.environ.get("CAPM_CACHE_SPILL_DIR")
+
+
+## Cache key for an analysis request
+
+def make_key(tickers, window, end, rf_source = 'none', return_type = 'simple'):
+    return (tuple(sorted(tickers)), window, end.isoformat(), rf_source, return_type)
+
+
+## Rough in-memory size of a cached value
+
+def sizeof(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep = True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep = True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sizeof(vars(value))
+    return sys.getsizeof(value)
+
+
+class AnalysisCache:
+
+    def __init__(self, max_bytes = MAX_BYTES, spill_dir = SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.entries = collections.OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def _spill_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.pkl")
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, value = self.entries.popitem(last = False)
+            self.total_bytes -= self.sizes.pop(key)
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok = True)
+                tmp = f"{self._spill_path(key)}.{os.getpid()}.tmp"
+                with open(tmp, 'wb') as f:
+                    pickle.dump((key, value), f)
+                os.replace(tmp, self._spill_path(key))
+
+    def _load_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self._spill_path(key), 'rb') as f:
+                stored_key, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return value if stored_key == key else None
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.sizes[key]
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.sizes[key] = sizeof(value)
+            self.total_bytes += self.sizes[key]
+            self._evict()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        value = self._load_spilled(key)
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    ## Most recent cached entry for the same request with an earlier end date
+
+    def latest_before(self, key):
+        with self.lock:
+            candidates = [k for k in self.entries if k[:2] == key[:2] and k[3:] == key[3:] and k[2] < key[2]]
+            if not candidates:
+                return None
+            return self.entries[max(candidates, key = lambda k: k[2])]
+
+    ## Return the cached value or compute it once, even if many sessions ask at the
+    ## same time. should_cache can veto storing a result (for example a partial one).
+
+    def get_or_compute(self, key, compute, should_cache = None):
+        with tracing.span('cache.analysis') as current:
+            value = self.get(key)
+            if value is not None:
+                tracing.annotate(current, cache = 'hit')
+                return value
+
+            with self.lock:
+                key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+            with key_lock:
+                value = self.get(key)
+                tracing.annotate(current, cache = 'miss' if value is None else 'hit')
+                if value is None:
+                    tier = shared_tier.get_tier()
+                    value = compute() if tier is None else tier.get_or_compute(key, compute, should_cache)
+                    if should_cache is None or should_cache(value):
+                        self.put(key, value)
+
+            with self.lock:
+                self.key_locks.pop(key, None)
+            return value
+
+
+_cache = None
+_cache_guard = threading.Lock()
+
+
+## The shared cache instance for this process
+
+def get_cache():
+    global _cache
+    with _cache_guard:
+        if _cache is None:
+            _cache = AnalysisCache()
+        return _cache
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+## Results tables that stay fast with thousands of tickers. Columns keep their
+## numeric dtypes; filtering, sorting and paging happen here on the server, so the
+## browser only receives the rows of the current page. Exports go through Arrow
+## instead of DataFrame.to_csv and are only built when a download is clicked.
+
+PAGE_SIZES = [25, 50, 100, 500]
+
+EXPORT_FORMATS = {
+    'parquet': ("Parquet", "application/vnd.apache.parquet"),
+    'csv': ("CSV", "text/csv"),
+}
+
+
+## Row positions that pass the filters, in sort order. text keeps rows whose
+## text_column contains it, ranges maps numeric columns to (low, high) bounds
+## (None for open).
+
+def matching_rows(table, sort_by = None, ascending = True, text = None, text_column = 'Stock', ranges = None):
+    mask = np.ones(len(table), dtype = bool)
+    if text:
+        mask &= table[text_column].astype(str).str.contains(text, case = False, regex = False).to_numpy()
+    for column, (low, high) in (ranges or {}).items():
+        values = table[column].to_numpy(dtype = 'float64')
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+    rows = np.flatnonzero(mask)
+
+    if sort_by is not None:
+        values = table[sort_by].to_numpy()[rows]
+        if pd.api.types.is_numeric_dtype(table[sort_by]):
+            ## Negating keeps NaNs last in both directions
+            order = np.argsort(values if ascending else -values.astype('float64'), kind = 'stable')
+        else:
+            order = np.argsort(values.astype(str), kind = 'stable')
+            order = order if ascending else order[::-1]
+        rows = rows[order]
+    return rows
+
+
+## One page of the filtered, sorted table and the number of matching rows
+
+def query(table, sort_by = None, ascending = True, text = None, text_column = 'Stock', ranges = None,
+          page = 0, page_size = 50):
+    rows = matching_rows(table, sort_by, ascending, text, text_column, ranges)
+    start = page * page_size
+    return table.iloc[rows[start:start + page_size]], len(rows)
+
+
+## Table as Parquet or CSV bytes, written by Arrow
+
+def export(table, fmt = 'parquet'):
+    import pyarrow as pa
+
+    arrow = pa.Table.from_pandas(table, preserve_index = False)
+    sink = pa.BufferOutputStream()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(arrow, sink)
+    else:
+        import pyarrow.csv as pa_csv
+        pa_csv.write_csv(arrow, sink)
+    return sink.getvalue().to_pybytes()
+
+
+## Streamlit view of a results table: filter and sort controls, one page of typed
+## rows and Arrow downloads of the filtered table. formats maps columns to printf
+## formats for display; the data itself is not rounded or turned into strings.
+
+def show_table(table, key, sort_by = None, ascending = False, formats = None, text_column = 'Stock',
+               file_name = "capm_results"):
+    import streamlit as st
+
+    numeric = [col for col in table.columns if pd.api.types.is_numeric_dtype(table[col])]
+    control1, control2, control3, control4 = st.columns([2, 2, 1, 1])
+    text = control1.text_input("Filter", key = f"{key}_filter", placeholder = f"{text_column} contains...") \
+        if text_column in table.columns else None
+    sort_by = control2.selectbox("Sort by", list(table.columns),
+                                 index = list(table.columns).index(sort_by) if sort_by in table.columns else 0,
+                                 key = f"{key}_sort")
+    ascending = control3.selectbox("Order", ["Descending", "Ascending"], index = int(ascending),
+                                   key = f"{key}_order") == "Ascending"
+    page_size = control4.selectbox("Rows", PAGE_SIZES, index = 1, key = f"{key}_rows")
+
+    ranges = {}
+    if numeric:
+        with st.expander("Range filters"):
+            for column in st.multiselect("Columns", numeric, key = f"{key}_range_columns"):
+                low_col, high_col = st.columns(2)
+                ranges[column] = (
+                    low_col.number_input(f"{column} ≥", value = None, key = f"{key}_low_{column}"),
+                    high_col.number_input(f"{column} ≤", value = None, key = f"{key}_high_{column}"),
+                )
+
+    rows = matching_rows(table, sort_by, ascending, text, text_column, ranges)
+    pages = max(1, -(-len(rows) // page_size))
+    page = st.number_input("Page", min_value = 1, max_value = pages, value = 1,
+                           key = f"{key}_page") - 1 if pages > 1 else 0
+
+    column_config = {column: st.column_config.NumberColumn(format = fmt) for column, fmt in (formats or {}).items()}
+    st.dataframe(table.iloc[rows[page * page_size:(page + 1) * page_size]], column_config = column_config,
+                 hide_index = True, width = "stretch")
+    st.caption(f"{len(rows):,} of {len(table):,} rows match · page {page + 1} of {pages}")
+
+    ## The filtered table is exported in the chosen order, built only on click
+    for column, (fmt, (label, mime)) in zip(st.columns(len(EXPORT_FORMATS)), EXPORT_FORMATS.items()):
+        column.download_button(f"📥 Download {label}", lambda fmt = fmt: export(table.iloc[rows], fmt),
+                               f"{file_name}.{fmt}", mime, key = f"{key}_download_{fmt}")
@@ -0,0 +1,70 @@
+import datetime
+
+## Risk-free rate for excess-return regressions. A source is 'none' (0%), a constant
+## annual rate in % such as '4.5', or a FRED series id such as 'DTB3'. FRED series go
+## through the local price store, so they are fetched once and shared by every ticker,
+## page and session. numpy, pandas and the store are imported on first use, so
+## pages can list SOURCES without loading them.
+
+SOURCES = {
+    'none': "None (0%)",
+    'DTB3': "3-Month Treasury Bill (DTB3)",
+}
+
+TRADING_DAYS = 252
+
+## Days loaded before the first date so it can be forward-filled from a prior value
+LOOKBACK_DAYS = 14
+
+
+## Annual rate in % to the equivalent compounded daily rate in %
+
+def deannualize(annual_rate):
+    import numpy as np
+
+    return ((1 + np.asarray(annual_rate, dtype = 'float64') / 100) ** (1 / TRADING_DAYS) - 1) * 100
+
+
+## Daily rate in % back to the compounded annual rate in %
+
+def annualize(daily_rate):
+    import numpy as np
+
+    return ((1 + np.asarray(daily_rate, dtype = 'float64') / 100) ** TRADING_DAYS - 1) * 100
+
+
+## Daily risk-free rate (in %) for each date, forward-filled onto the trading calendar
+
+def daily_rates(dates, source = 'none'):
+    import numpy as np
+    import pandas as pd
+    import utils.data_store as store
+
+    dates = pd.DatetimeIndex(dates)
+    if source == 'none' or len(dates) == 0:
+        return np.zeros(len(dates))
+
+    try:
+        return np.full(len(dates), deannualize(float(source)))
+    except ValueError:
+        pass
+
+    start = dates.min().date() - datetime.timedelta(days = LOOKBACK_DAYS)
+    rates = store.load_series(source, start, dates.max().date(), source = 'fred').dropna()
+    if rates.empty:
+        raise RuntimeError(f"no risk-free data for {source}")
+
+    ## Position of the last published rate on or before each date (first rate if none)
+    positions = np.searchsorted(rates.index.to_numpy(), dates.to_numpy(), side = 'right') - 1
+    return deannualize(rates.to_numpy()[np.maximum(positions, 0)])
+
+
+## Subtract the daily risk-free rate from every return column (stocks and market)
+
+def excess_returns(returns, rf_daily):
+    import numpy as np
+
+    excess = returns.copy()
+    columns = excess.columns[1:]
+    excess[columns] = excess[columns].to_numpy() - np.asarray(rf_daily)[:, None]
+    return excess
@@ -0,0 +1,190 @@
+import contextlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+import utils.tracing as tracing
+
+## Shared tier for deployments with several Streamlit replicas. The in-process
+## caches are per replica; this tier lets every node see the analyses another node
+## has computed and makes sure a given (tickers, window, end date) analysis or price
+## download runs on one node at a time while the others wait and reuse it.
+##
+## Backends store opaque bytes under string keys and hand out leases, which expire
+## so that a node dying mid-computation does not block the others for good:
+##   sqlite   one SQLite file in CAPM_SHARED_DIR, on a volume every node mounts
+##   memory   in-process stand-in with the same behaviour, for a single node
+## Any other store (Redis, ...) only needs the same four methods.
+##
+## The tier is off unless CAPM_SHARED_DIR or CAPM_SHARED_BACKEND is set.
+
+SHARED_DIR = os.environ.get("CAPM_SHARED_DIR")
+BACKEND = os.environ.get("CAPM_SHARED_BACKEND", "sqlite" if SHARED_DIR else "")
+
+## Seconds before an unreleased lease is considered abandoned
+LEASE_SECONDS = int(os.environ.get("CAPM_SHARED_LEASE", 300))
+
+## Stored analyses older than this are dropped when a node opens the tier
+RETENTION_DAYS = float(os.environ.get("CAPM_SHARED_RETENTION_DAYS", 7))
+
+POLL_SECONDS = 0.2
+
+
+class MemoryBackend:
+
+    def __init__(self):
+        self.values = {}
+        self.leases = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.values.get(key)
+
+    def put(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def acquire(self, key, owner, seconds):
+        now = time.time()
+        with self.lock:
+            holder = self.leases.get(key)
+            if holder is not None and holder[1] > now:
+                return False
+            self.leases[key] = (owner, now + seconds)
+            return True
+
+    def release(self, key, owner):
+        with self.lock:
+            if self.leases.get(key, (None,))[0] == owner:
+                del self.leases[key]
+
+
+## SQLite on a shared volume. Every statement is atomic on its own, so there are no
+## explicit transactions; each thread gets its own connection.
+
+class SQLiteBackend:
+
+    def __init__(self, directory = None, retention_days = RETENTION_DAYS):
+        directory = directory or SHARED_DIR
+        os.makedirs(directory, exist_ok = True)
+        self.path = os.path.join(directory, "capm_shared.sqlite")
+        self.local = threading.local()
+
+        db = self._connection()
+        db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, created REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT, expires REAL)")
+        db.execute("DELETE FROM entries WHERE created < ?", (time.time() - retention_days * 86400,))
+
+    def _connection(self):
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = self.local.db = sqlite3.connect(self.path, timeout = 30, isolation_level = None)
+        return db
+
+    def get(self, key):
+        row = self._connection().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, key, value):
+        self._connection().execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, value, time.time()))
+
+    ## Take the lease if nobody holds it or the holder's lease ran out
+
+    def acquire(self, key, owner, seconds):
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE "
+            "SET owner = excluded.owner, expires = excluded.expires WHERE leases.expires <= ?",
+            (key, owner, now + seconds, now),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        self._connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+
+BACKENDS = {'sqlite': SQLiteBackend, 'memory': MemoryBackend}
+
+
+class SharedTier:
+
+    def __init__(self, backend, lease_seconds = LEASE_SECONDS):
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+
+    def get(self, key):
+        value = self.backend.get(repr(key))
+        return None if value is None else pickle.loads(value)
+
+    def put(self, key, value):
+        self.backend.put(repr(key), pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL))
+
+    ## Hold the lease on name for the duration of the block, waiting for it if
+    ## another node has it
+
+    @contextlib.contextmanager
+    def lock(self, name):
+        owner = uuid.uuid4().hex
+        lease = f"lock:{name}"
+        while not self.backend.acquire(lease, owner, self.lease_seconds):
+            time.sleep(POLL_SECONDS)
+        try:
+            yield
+        finally:
+            self.backend.release(lease, owner)
+
+    ## Stored value for key, or compute it here if no other node is already doing so.
+    ## Waiting nodes pick up the stored result once the computing node releases the
+    ## lease, or compute it themselves if it was not stored (see should_cache).
+
+    def get_or_compute(self, key, compute, should_cache = None):
+        with tracing.span('cache.shared') as current:
+            value = self.get(key)
+            if value is not None:
+                tracing.annotate(current, cache = 'hit')
+                return value
+
+            owner = uuid.uuid4().hex
+            lease = f"lease:{key!r}"
+            waited = False
+            while not self.backend.acquire(lease, owner, self.lease_seconds):
+                waited = True
+                time.sleep(POLL_SECONDS)
+                value = self.get(key)
+                if value is not None:
+                    tracing.annotate(current, cache = 'wait')
+                    return value
+
+            try:
+                ## The previous holder may have stored it just before releasing
+                value = self.get(key) if waited else None
+                tracing.annotate(current, cache = 'miss' if value is None else 'wait')
+                if value is None:
+                    value = compute()
+                    if should_cache is None or should_cache(value):
+                        self.put(key, value)
+                return value
+            finally:
+                self.backend.release(lease, owner)
+
+
+_tier = None
+_tier_guard = threading.Lock()
+
+
+## The shared tier of this process, None when the deployment does not use one
+
+def get_tier():
+    global _tier
+    if not BACKEND:
+        return None
+    with _tier_guard:
+        if _tier is None:
+            if BACKEND not in BACKENDS:
+                raise ValueError(f"unknown CAPM_SHARED_BACKEND {BACKEND!r}, expected one of {sorted(BACKENDS)}")
+            _tier = SharedTier(BACKENDS[BACKEND]())
+        return _tier
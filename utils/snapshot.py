@@ -0,0 +1,243 @@
+import argparse
+import datetime
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import utils.shared_tier as shared_tier
+
+## Precomputed beta snapshot. A nightly job runs the CAPM regression for every
+## ticker of the universe, every window from 1 to 25 years and each risk-free source,
+## and writes one structured NumPy array sorted by symbol. The pages memory-map it,
+## so the headline figures of a common request are a binary search away, with no
+## download and no regression; the full analysis only runs when the detailed views
+## are opened.
+##
+##   python -m utils.snapshot --risk-free none DTB3 --processes 8
+##
+## The file is replaced atomically; pages pick up a new one on their next run.
+## numpy is imported on first use, the pages' landing state does without it.
+
+SNAPSHOT_FILE = os.environ.get(
+    "CAPM_SNAPSHOT_FILE",
+    os.path.join(shared_tier.SHARED_DIR, "capm_snapshot.npy") if shared_tier.SHARED_DIR else
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "capm_snapshot.npy"),
+)
+
+## Days after its end date a snapshot row is still served (covers weekends)
+MAX_AGE_DAYS = int(os.environ.get("CAPM_SNAPSHOT_MAX_AGE_DAYS", 3))
+
+YEARS = range(1, 26)
+
+FIELDS = [
+    ('symbol', 'S16'),
+    ('rf_source', 'S8'),
+    ('years', 'u1'),
+    ('end', 'M8[D]'),
+    ('beta', 'f8'),
+    ('alpha', 'f8'),
+    ('r_squared', 'f8'),
+    ('capm_return', 'f8'),
+    ('rm', 'f8'),
+    ('rf', 'f8'),
+    ('observations', 'i4'),
+]
+
+
+def dtype():
+    import numpy as np
+    return np.dtype(FIELDS)
+
+
+class Snapshot:
+
+    def __init__(self, data = None):
+        import numpy as np
+        self.data = np.empty(0, dtype = dtype()) if data is None else data
+
+    @classmethod
+    def load(cls, path = SNAPSHOT_FILE):
+        import numpy as np
+        try:
+            data = np.load(path, mmap_mode = 'r')
+        except (OSError, ValueError):
+            return cls()
+        return cls(data) if data.dtype == dtype() else cls()
+
+    def __len__(self):
+        return len(self.data)
+
+    ## Figures of one (symbol, window, risk-free source) as a dict, None when the
+    ## snapshot does not have them or they are older than MAX_AGE_DAYS
+
+    def lookup(self, symbol, years, rf_source = 'none', today = None):
+        import numpy as np
+        key = symbol.encode()
+        symbols = self.data['symbol']
+        rows = self.data[np.searchsorted(symbols, key, 'left'):np.searchsorted(symbols, key, 'right')]
+        match = np.flatnonzero((rows['years'] == years) & (rows['rf_source'] == rf_source.encode()))
+        if not len(match):
+            return None
+
+        row = rows[match[0]]
+        end = row['end'].astype(datetime.date)
+        if ((today or datetime.date.today()) - end).days > MAX_AGE_DAYS:
+            return None
+        return {
+            'symbol': symbol, 'rf_source': rf_source, 'years': years, 'end': end,
+            **{name: row[name].item() for name, _ in FIELDS[4:]},
+        }
+
+    ## Rows for every ticker, or None if any of them is missing
+
+    def lookup_all(self, tickers, years, rf_source = 'none', today = None):
+        rows = [self.lookup(ticker, years, rf_source, today) for ticker in tickers]
+        return None if any(row is None for row in rows) else rows
+
+
+_snapshot = None
+_snapshot_key = None
+_snapshot_guard = threading.Lock()
+
+
+## The memory-mapped snapshot, mapped again only when the file changes
+
+def get_snapshot(path = None):
+    global _snapshot, _snapshot_key
+    path = path or SNAPSHOT_FILE
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except OSError:
+        key = (path, None)
+
+    with _snapshot_guard:
+        if key != _snapshot_key:
+            _snapshot = Snapshot.load(path)
+            _snapshot_key = key
+        return _snapshot
+
+
+## Snapshot rows of one chunk of tickers. Prices are loaded once for the longest
+## window; each shorter window is a slice of the same returns, starting the day
+## after its first benchmark day like a page's own download. Rows follow the
+## benchmark calendar, so a ticker's figures do not depend on its chunk.
+
+def _build_chunk(tickers, end, rf_sources, years):
+    import numpy as np
+    import pandas as pd
+    import utils.align as align
+    import utils.analysis as an
+    import utils.data_store as store
+    import utils.functions as fn
+    import utils.regression as reg
+    import utils.risk_free as risk_free
+
+    try:
+        prices, benchmark, failed = store.load_market_data(tickers, an.window_start(max(years), end), end)
+    except Exception as e:
+        return np.empty(0, dtype = dtype()), {ticker: f"{type(e).__name__}: {e}" for ticker in tickers}
+    if prices.empty:
+        return np.empty(0, dtype = dtype()), failed
+
+    stocks_df, _ = align.align_to_benchmark(prices, benchmark)
+    returns = fn.daily_returns(stocks_df)
+    calendar = stocks_df['Date']
+
+    parts = []
+    for rf_source in rf_sources:
+        rf_daily = risk_free.daily_rates(returns['Date'], rf_source)
+        excess = risk_free.excess_returns(returns, rf_daily)
+        for y in years:
+            first = calendar[calendar >= pd.Timestamp(an.window_start(y, end))].min()
+            rows = (excess['Date'] > first).to_numpy()
+            summary = reg.regress_on_market(excess[rows])
+
+            ## Rm over the whole window, as on both pages
+            rf = float(risk_free.annualize(rf_daily[rows].mean()))
+            rm = excess.loc[rows, 'SP500'].mean() * 252 + rf
+            part = np.zeros(len(summary), dtype = dtype())
+            part['symbol'] = summary.index.to_numpy(dtype = str)
+            part['rf_source'] = rf_source
+            part['years'] = y
+            part['end'] = np.datetime64(end, 'D')
+            part['beta'] = summary['beta'].to_numpy()
+            part['alpha'] = summary['alpha'].to_numpy()
+            part['r_squared'] = summary['r_squared'].to_numpy()
+            part['capm_return'] = an.capm_return(part['beta'], rm, rf)
+            part['rm'] = rm
+            part['rf'] = rf
+            part['observations'] = summary['observations'].to_numpy()
+            parts.append(part[np.isfinite(part['beta'])])
+
+    return np.concatenate(parts), failed
+
+
+## Build the snapshot for every ticker and write it to path.
+## Returns (rows written, errors by ticker).
+
+def build(tickers, end = None, rf_sources = ('none',), years = YEARS, path = None,
+          chunk_size = 100, processes = None):
+    import numpy as np
+    import pandas as pd
+    import utils.analysis as an
+    import utils.data_store as store
+    import utils.risk_free as risk_free
+
+    end = end or datetime.date.today()
+    path = path or SNAPSHOT_FILE
+    ## Warm the benchmark and risk-free series once so the workers read them from the store
+    start = an.window_start(max(years), end)
+    store.load_benchmark(start, end)
+    for rf_source in rf_sources:
+        risk_free.daily_rates(pd.bdate_range(start, end), rf_source)
+
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    parts, failed = [], {}
+    with ProcessPoolExecutor(max_workers = processes) as pool:
+        futures = [pool.submit(_build_chunk, chunk, end, list(rf_sources), list(years)) for chunk in chunks]
+        for future in as_completed(futures):
+            part, errors = future.result()
+            parts.append(part)
+            failed.update(errors)
+
+    data = np.concatenate(parts) if parts else np.empty(0, dtype = dtype())
+    data = data[np.lexsort((data['years'], data['rf_source'], data['symbol']))]
+
+    ## Readers keep their mapping of the old file until they map the new one
+    os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+    tmp = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp, data)
+    os.replace(tmp, path)
+    return len(data), failed
+
+
+def main(argv = None):
+    import utils.batch as batch
+    import utils.symbols as symbols
+
+    parser = argparse.ArgumentParser(description = "Precompute betas and CAPM returns for every ticker and window.")
+    parser.add_argument('--tickers', default = None, help = "file with one ticker per line (default: the whole symbol master)")
+    parser.add_argument('--end', type = datetime.date.fromisoformat, default = None, help = "end date, YYYY-MM-DD (default today)")
+    parser.add_argument('--risk-free', nargs = '+', default = ['none'], help = "risk-free sources to precompute, e.g. none DTB3")
+    parser.add_argument('--output', default = None, help = f"snapshot file (default {SNAPSHOT_FILE})")
+    parser.add_argument('--chunk-size', type = int, default = 100)
+    parser.add_argument('--processes', type = int, default = os.cpu_count())
+    args = parser.parse_args(argv)
+
+    index = symbols.get_index()
+    tickers, unknown = index.validate(batch.read_tickers(args.tickers) if args.tickers else index.symbols)
+    failed = {ticker: "not a valid ticker symbol" for ticker in unknown}
+    rows, errors = build(tickers, args.end, args.risk_free, path = args.output,
+                         chunk_size = args.chunk_size, processes = args.processes)
+    failed.update(errors)
+
+    for ticker, reason in sorted(failed.items()):
+        print(f"{ticker}: {reason}", file = sys.stderr)
+    print(f"Wrote {rows} rows for {len(tickers) - len(errors)} of {len(tickers) + len(unknown)} tickers "
+          f"to {args.output or SNAPSHOT_FILE}", file = sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
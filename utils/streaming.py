@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+import utils.regression as reg
+
+## Intraday streaming beta. Bars come from a pluggable source; each source has
+## poll() returning the bars that arrived since the last call as a list of
+## (timestamp, {symbol: close}) tuples in time order.
+
+## FRED only publishes the SP500 daily, intraday bars are regressed on the SPY ETF
+MARKET_SYMBOL = 'SPY'
+
+
+## Replays bars from a long-format CSV (Timestamp, Symbol, Close), a few per poll.
+## Stands in for a live feed in tests and demos.
+
+class ReplaySource:
+
+    def __init__(self, path_or_frame, bars_per_poll = 1):
+        if isinstance(path_or_frame, pd.DataFrame):
+            frame = path_or_frame
+        else:
+            frame = pd.read_csv(path_or_frame, parse_dates = ['Timestamp'])
+        wide = frame.pivot_table(index = 'Timestamp', columns = 'Symbol', values = 'Close').sort_index()
+        self.bars = [(timestamp, row.dropna().to_dict()) for timestamp, row in wide.iterrows()]
+        self.position = 0
+        self.bars_per_poll = bars_per_poll
+
+    @property
+    def finished(self):
+        return self.position >= len(self.bars)
+
+    def poll(self):
+        bars = self.bars[self.position:self.position + self.bars_per_poll]
+        self.position += len(bars)
+        return bars
+
+
+## Polls Yahoo Finance for today's intraday bars and returns only the new ones
+
+class YahooIntradaySource:
+
+    finished = False
+
+    def __init__(self, symbols, interval = '1m'):
+        self.symbols = list(symbols)
+        self.interval = interval
+        self.last_timestamp = None
+
+    def poll(self):
+        import yfinance as yf
+
+        if self.last_timestamp is None:
+            data = yf.download(self.symbols, period = '1d', interval = self.interval, progress = False, auto_adjust = True)
+        else:
+            data = yf.download(self.symbols, start = self.last_timestamp, interval = self.interval,
+                               progress = False, auto_adjust = True)
+        if data.empty:
+            return []
+        closes = data['Close']
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(self.symbols[0])
+        ## The last bar is still forming, wait until it closes
+        closes = closes.iloc[:-1]
+        if self.last_timestamp is not None:
+            closes = closes[closes.index > self.last_timestamp]
+        if closes.empty:
+            return []
+        self.last_timestamp = closes.index[-1]
+        return [(timestamp, row.dropna().to_dict()) for timestamp, row in closes.iterrows()]
+
+
+## Rolling beta, correlation and volatility for several tickers over the last
+## `window` bars. Returns live in a fixed-size ring buffer, so memory per ticker is
+## bounded, and every bar updates the running moments in O(1) per ticker: the new
+## return is added and the one it overwrites is removed.
+
+class StreamingBeta:
+
+    def __init__(self, tickers, window = 390, market = MARKET_SYMBOL, resync_every = None):
+        ## The market is the regressor, it cannot be one of the tickers as well
+        self.tickers = [t for t in dict.fromkeys(tickers) if t != market]
+        self.market = market
+        self.window = window
+        self.market_returns = np.full(window, np.nan)
+        self.stock_returns = np.full((window, len(self.tickers)), np.nan)
+        self.timestamps = np.full(window, np.datetime64('NaT'), dtype = 'datetime64[ns]')
+        self.count = 0
+        self.last_close = {}
+        ## Market bar on which each last close was seen
+        self.last_bar = {}
+        self.bars = 0
+        self.stats = reg.RegressionStats(self.tickers)
+        ## Running updates drift slowly, rebuild the moments from the buffer now and then
+        self.resync_every = resync_every or 10 * window
+
+    ## Fold in one bar; returns the tickers whose metrics changed
+
+    def on_bar(self, timestamp, closes):
+        ## Without a market bar nothing can be regressed; keep the old closes so the
+        ## next returns span the same interval for market and stocks
+        if self.market not in closes:
+            return set()
+        bar, previous_bar = self.bars, self.last_bar
+        previous, self.last_close = self.last_close, {**self.last_close, **closes}
+        self.last_bar = {**previous_bar, **dict.fromkeys(closes, bar)}
+        self.bars += 1
+        if self.market not in previous:
+            return set()
+
+        ## A ticker missing from the previous bar would span two market intervals
+        x = (closes[self.market] / previous[self.market] - 1) * 100
+        y = np.array([
+            (closes[t] / previous[t] - 1) * 100 if t in closes and previous_bar.get(t) == bar - 1 else np.nan
+            for t in self.tickers
+        ])
+
+        slot = self.count % self.window
+        if self.count >= self.window:
+            self.stats.remove(self.market_returns[slot], self.stock_returns[slot])
+        self.market_returns[slot] = x
+        self.stock_returns[slot] = y
+        self.timestamps[slot] = np.datetime64(pd.Timestamp(timestamp).tz_localize(None), 'ns')
+        self.stats.add(x, y)
+        self.count += 1
+
+        if self.count % self.resync_every == 0:
+            self.stats = reg.RegressionStats.from_returns(self.frame(), self.market)
+
+        return {t for t, value in zip(self.tickers, y) if not np.isnan(value)}
+
+    def on_bars(self, bars):
+        changed = set()
+        for timestamp, closes in bars:
+            changed |= self.on_bar(timestamp, closes)
+        return changed
+
+    ## Returns currently in the window, oldest first
+
+    def frame(self):
+        filled = min(self.count, self.window)
+        order = (np.arange(filled) + (self.count - filled)) % self.window
+        frame = pd.DataFrame(self.stock_returns[order], columns = self.tickers)
+        frame[self.market] = self.market_returns[order]
+        frame.insert(0, 'Date', self.timestamps[order])
+        return frame
+
+    def metrics(self):
+        return self.stats.summary()
@@ -0,0 +1,168 @@
+import bisect
+import csv
+import os
+import re
+import threading
+
+## Symbol master: the tickers offered by the search, with name, exchange and type.
+## It is read from a CSV (Symbol, Name, Exchange, Type) bundled in data/symbols.csv,
+## or from the file in CAPM_SYMBOLS_FILE. NASDAQ Trader's pipe-delimited
+## nasdaqtraded.txt is read as is, so the full US listing (~12,000 equities and ETFs)
+## can be dropped in without conversion.
+##
+## Lookups use sorted arrays and bisect, plus a table of one-character deletions for
+## typos, so a search touches only the matching slice and stays well under a
+## millisecond on tens of thousands of symbols.
+
+SYMBOLS_FILE = os.environ.get(
+    "CAPM_SYMBOLS_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "symbols.csv"),
+)
+
+## Shown before the user has searched for anything
+DEFAULT_SYMBOLS = ["AAPL", "GOOGL", "MSFT", "NFLX", "AMZN", "TSLA", "META", "NVDA", "JPM", "MGM"]
+
+_WORD = re.compile(r"[A-Z0-9]+")
+
+## Yahoo spelling of a listing: BRK-B, RY.TO, ^GSPC, EURUSD=X
+_TICKER = re.compile(r"\^?[A-Z0-9][A-Z0-9.=-]{0,14}")
+
+
+def _deletes(symbol):
+    return {symbol[:i] + symbol[i + 1:] for i in range(len(symbol))}
+
+
+## Rows of (symbol, name, exchange, type). Read with the csv module rather than
+## pandas, so the landing pages can search without importing pandas.
+
+def load_symbols(path = SYMBOLS_FILE):
+    nasdaq = path.endswith('.txt')
+    rows = {}
+    with open(path, newline = '', encoding = 'utf-8') as f:
+        for record in csv.DictReader(f, delimiter = '|' if nasdaq else ','):
+            if nasdaq:
+                ## The last line is the file creation time, test issues are not real listings
+                if record.get('Security Name') is None or record.get('Test Issue') == 'Y':
+                    continue
+                record = {
+                    'Symbol': record['Symbol'].replace('.', '-'),   # Yahoo spelling, BRK.B -> BRK-B
+                    'Name': record['Security Name'],
+                    'Exchange': record.get('Listing Exchange', ''),
+                    'Type': 'ETF' if record.get('ETF') == 'Y' else 'Equity',
+                }
+            symbol = (record.get('Symbol') or '').strip().upper()
+            if symbol and symbol not in rows:
+                rows[symbol] = (symbol, record.get('Name') or '', record.get('Exchange') or '', record.get('Type') or '')
+    return list(rows.values())
+
+
+def is_ticker(text):
+    return _TICKER.fullmatch(text.strip().upper()) is not None
+
+
+class SymbolIndex:
+
+    def __init__(self, rows):
+        rows = sorted(rows)
+        self.symbols = [row[0] for row in rows]
+        self.names = {row[0]: row[1] for row in rows}
+        self.types = {row[0]: row[3] for row in rows}
+
+        ## Every word of every name, sorted, for prefix search on company names
+        self.name_words = {symbol: _WORD.findall(name.upper()) for symbol, name in self.names.items()}
+        words = sorted((word, symbol) for symbol, name_words in self.name_words.items() for word in set(name_words))
+        self.words = [word for word, _ in words]
+        self.word_symbols = [symbol for _, symbol in words]
+
+        ## Symbols by each one-character deletion: two symbols one edit apart share a key
+        self.variants = {}
+        for symbol in self.symbols:
+            for key in _deletes(symbol) | {symbol}:
+                self.variants.setdefault(key, []).append(symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.names
+
+    def label(self, symbol):
+        name = self.names.get(symbol)
+        return f"{symbol} · {name}" if name else symbol
+
+    ## Symbols starting with prefix, in alphabetical order
+
+    def prefix(self, prefix, limit = 20):
+        start = bisect.bisect_left(self.symbols, prefix)
+        matches = []
+        for symbol in self.symbols[start:start + limit]:
+            if not symbol.startswith(prefix):
+                break
+            matches.append(symbol)
+        return matches
+
+    ## Positions in self.words of the name words starting with prefix
+
+    def _name_range(self, prefix):
+        start = bisect.bisect_left(self.words, prefix)
+        return start, bisect.bisect_left(self.words, prefix + '\uffff', start)
+
+    ## Symbols whose name has a word starting with every one of the query words.
+    ## Candidates come from the narrowest word's slice and the scan stops at limit.
+
+    def _name_matches(self, words, limit):
+        ranges = sorted((self._name_range(word) for word in words), key = lambda r: r[1] - r[0])
+        start, end = ranges[0]
+        matches = {}
+        for symbol in self.word_symbols[start:end]:
+            if len(matches) >= limit:
+                break
+            if symbol not in matches and all(
+                any(name_word.startswith(word) for name_word in self.name_words[symbol]) for word in words
+            ):
+                matches[symbol] = None
+        return list(matches)
+
+    ## Ranked matches for free text: exact symbol, symbol prefix, name words, then
+    ## symbols one typo away
+
+    def search(self, query, limit = 20):
+        query = query.strip().upper()
+        if not query:
+            return []
+
+        matches = dict.fromkeys([query] if query in self else [])
+        matches.update(dict.fromkeys(self.prefix(query, limit)))
+
+        words = _WORD.findall(query)
+        if words and len(matches) < limit:
+            matches.update(dict.fromkeys(self._name_matches(words, limit)))
+
+        if len(matches) < limit:
+            close = set()
+            for key in _deletes(query) | {query}:
+                close.update(self.variants.get(key, ()))
+            matches.update(dict.fromkeys(sorted(close)))
+
+        return list(matches)[:limit]
+
+    ## Split tickers into ones worth downloading and malformed ones. Symbols missing
+    ## from the master are still tried, the bundled file only lists the large caps.
+
+    def validate(self, tickers):
+        tickers = [ticker.strip().upper() for ticker in tickers]
+        return [t for t in tickers if is_ticker(t)], [t for t in tickers if not is_ticker(t)]
+
+
+_index = None
+_index_guard = threading.Lock()
+
+
+## The shared index for this process, built on first use
+
+def get_index():
+    global _index
+    with _index_guard:
+        if _index is None:
+            _index = SymbolIndex(load_symbols())
+        return _index
@@ -0,0 +1,164 @@
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+## Lightweight tracing of page runs. A trace collects named spans with their
+## duration and attributes (bytes fetched, cache hit/miss, ...). When no trace is
+## active, span() and record() return immediately, so instrumentation is cheap to
+## leave in place.
+##
+## Enable with CAPM_TRACE=1 or the ?debug=1 query parameter. Finished traces are
+## logged as JSON on the 'capm.trace' logger and, if CAPM_METRICS_FILE is set,
+## aggregated into a Prometheus text file for a node_exporter textfile collector.
+
+ENABLED = os.environ.get("CAPM_TRACE", "0") == "1"
+METRICS_FILE = os.environ.get("CAPM_METRICS_FILE")
+
+logger = logging.getLogger('capm.trace')
+
+_current_trace = contextvars.ContextVar('capm_trace', default = None)
+_current_span = contextvars.ContextVar('capm_span', default = None)
+
+
+class Trace:
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        return {
+            'trace': self.name,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'spans': [
+                {'name': s['name'], 'parent': s['parent'], 'offset_ms': round(s['offset'] * 1000, 3),
+                 'duration_ms': round(s['duration'] * 1000, 3), **s['attrs']}
+                for s in self.spans
+            ],
+        }
+
+
+## Start a trace for one page run, returns None when tracing is disabled
+
+def begin(name, enabled = None):
+    if not (ENABLED if enabled is None else enabled):
+        return None
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+def end(trace):
+    if trace is None:
+        return
+    trace.duration = time.perf_counter() - trace.start
+    _current_trace.set(None)
+    logger.info(json.dumps(trace.to_dict()))
+    _metrics.observe(trace)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = {'name': name, 'parent': _current_span.get(), 'attrs': dict(attrs),
+              'offset': time.perf_counter() - trace.start}
+    token = _current_span.set(name)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['duration'] = time.perf_counter() - start
+        _current_span.reset(token)
+        trace.add(record)
+
+
+## Attach attributes to the innermost open span of the current trace
+
+def annotate(current, **attrs):
+    if current is not None:
+        current['attrs'].update(attrs)
+
+
+## Run func in a copy of the current context, so spans from worker threads join the trace
+
+def bind(func):
+    context = contextvars.copy_context()
+    return lambda: context.run(func)
+
+
+## Process-wide aggregates of every finished trace, written in Prometheus text format
+
+class _Metrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.seconds = {}
+        self.cache = {}
+        self.bytes = 0
+
+    def observe(self, trace):
+        with self.lock:
+            for s in trace.spans + [{'name': trace.name, 'duration': trace.duration, 'attrs': {}}]:
+                self.counts[s['name']] = self.counts.get(s['name'], 0) + 1
+                self.seconds[s['name']] = self.seconds.get(s['name'], 0.0) + s['duration']
+                if 'cache' in s['attrs']:
+                    key = (s['name'], s['attrs']['cache'])
+                    self.cache[key] = self.cache.get(key, 0) + 1
+                self.bytes += s['attrs'].get('bytes', 0)
+            text = self.text()
+
+        if METRICS_FILE:
+            tmp = f"{METRICS_FILE}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                f.write(text)
+            os.replace(tmp, METRICS_FILE)
+
+    def text(self):
+        lines = ["# TYPE capm_span_seconds_total counter", "# TYPE capm_span_count_total counter"]
+        for name in sorted(self.counts):
+            lines.append(f'capm_span_seconds_total{{span="{name}"}} {self.seconds[name]:.6f}')
+            lines.append(f'capm_span_count_total{{span="{name}"}} {self.counts[name]}')
+        lines.append("# TYPE capm_cache_lookups_total counter")
+        for (name, result), count in sorted(self.cache.items()):
+            lines.append(f'capm_cache_lookups_total{{span="{name}",result="{result}"}} {count}')
+        lines.append("# TYPE capm_fetched_bytes_total counter")
+        lines.append(f"capm_fetched_bytes_total {self.bytes}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = _Metrics()
+
+
+def metrics_text():
+    with _metrics.lock:
+        return _metrics.text()
+
+
+## Optional debug panel listing the spans of a finished trace
+
+def show_panel(trace):
+    if trace is None:
+        return
+    import pandas as pd
+    import streamlit as st
+
+    with st.expander(f"🛠️ Timing: {trace.name} took {trace.duration * 1000:.1f} ms"):
+        spans = pd.DataFrame(trace.to_dict()['spans'])
+        st.dataframe(spans, width="stretch")
+        st.code(metrics_text(), language="text")
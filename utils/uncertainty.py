@@ -0,0 +1,163 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import utils.regression as reg
+
+## Uncertainty of the beta and alpha estimates, for every stock column at once.
+##
+## HAC: Newey-West standard errors, robust to the autocorrelation and changing
+## volatility of daily returns.
+## Bootstrap: circular moving-block resamples of whole days, so the dependence
+## inside each block is kept. A batch of resamples is drawn as one index matrix and
+## turned into per-day weights, which makes every resampled regression a weighted
+## sum: the whole batch is solved with a handful of matrix products.
+
+RESAMPLES = int(os.environ.get("CAPM_BOOTSTRAP_RESAMPLES", 1000))
+PROCESSES = int(os.environ.get("CAPM_BOOTSTRAP_PROCESSES", 0)) or None
+CONFIDENCE = 0.95
+
+## Resamples solved per batch, bounds the weight matrix to BATCH_SIZE x days
+BATCH_SIZE = 250
+
+
+def default_block_length(n):
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def default_lags(n):
+    return max(1, int(4 * (n / 100) ** (2 / 9)))
+
+
+## Returns as (market x, stock matrix Y, mask of usable cells) centered by the
+## overall means; beta and its errors are unaffected and the sums stay small
+
+def _centered(returns, market):
+    stocks = [col for col in returns.columns if col not in ('Date', market)]
+    x = returns[market].to_numpy(dtype = 'float64')
+    Y = returns[stocks].to_numpy(dtype = 'float64')
+    mask = ~np.isnan(Y) & ~np.isnan(x)[:, None]
+    X = np.where(mask, x[:, None] - np.nanmean(x), 0.0)
+    Y = np.where(mask, Y - np.nanmean(Y, axis = 0), 0.0)
+    return stocks, x, X, Y, mask
+
+
+## Index matrix of circular moving-block resamples, one row per resample
+
+def block_indices(n, resamples, block_length, rng):
+    blocks = -(-n // block_length)
+    starts = rng.integers(0, n, size = (resamples, blocks))
+    indices = (starts[:, :, None] + np.arange(block_length)) % n
+    return indices.reshape(resamples, -1)[:, :n]
+
+
+## Betas and alphas of one batch of resamples (resamples x stocks)
+
+def _solve_batch(X, Y, mask, resamples, block_length, seed):
+    n = len(X)
+    indices = block_indices(n, resamples, block_length, np.random.default_rng(seed))
+    ## Times each day is drawn in each resample
+    weights = np.bincount((indices + n * np.arange(resamples)[:, None]).ravel(),
+                          minlength = resamples * n).reshape(resamples, n).astype('float64')
+
+    m = mask.astype('float64')
+    count = weights @ m
+    sx, sy = weights @ X, weights @ Y
+    sxx, sxy = weights @ (X * X), weights @ (X * Y)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean_x, mean_y = sx / count, sy / count
+        beta = (sxy - sx * mean_y) / (sxx - sx * mean_x)
+        alpha = mean_y - beta * mean_x
+    return beta, alpha
+
+
+## Bootstrap distribution of beta and alpha, (resamples x stocks) each. Batches get
+## their own seeds from `seed`, so results do not depend on the number of processes.
+
+def bootstrap(returns, market = reg.MARKET, resamples = RESAMPLES, block_length = None,
+              seed = 0, processes = PROCESSES):
+    stocks, x, X, Y, mask = _centered(returns, market)
+    block_length = block_length or default_block_length(len(X))
+
+    sizes = [min(BATCH_SIZE, resamples - i) for i in range(0, resamples, BATCH_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(X, Y, mask, size, block_length, s) for size, s in zip(sizes, seeds)]
+
+    if processes and processes > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            results = list(pool.map(_solve_batch, *zip(*args)))
+    else:
+        results = [_solve_batch(*a) for a in args]
+
+    if not results:
+        empty = np.empty((0, len(stocks)))
+        return empty, empty
+    betas, alphas = zip(*results)
+    ## Alpha of the centered data is shifted back to the raw means
+    shift = np.nanmean(returns[stocks].to_numpy(dtype = 'float64'), axis = 0) - np.vstack(betas) * np.nanmean(x)
+    return np.vstack(betas), np.vstack(alphas) + shift
+
+
+## Newey-West long-run variance of each column of the scores g (days x stocks)
+
+def _long_run_variance(g, lags):
+    variance = np.einsum('ij,ij->j', g, g)
+    for lag in range(1, lags + 1):
+        weight = 1 - lag / (lags + 1)
+        variance += 2 * weight * np.einsum('ij,ij->j', g[lag:], g[:-lag])
+    return variance
+
+
+## HAC standard errors of beta and alpha for every stock column
+
+def hac_errors(returns, market = reg.MARKET, lags = None):
+    stocks, x, X, Y, mask = _centered(returns, market)
+    n = mask.sum(axis = 0)
+    lags = lags or default_lags(len(X))
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        mean_x = X.sum(axis = 0) / n
+        mean_y = Y.sum(axis = 0) / n
+        Xc = np.where(mask, X - mean_x, 0.0)
+        cxx = np.einsum('ij,ij->j', Xc, Xc)
+        beta = np.einsum('ij,ij->j', Xc, Y) / cxx
+        residuals = np.where(mask, Y - mean_y - beta * Xc, 0.0)
+
+        ## Influence of each day on beta and on alpha = mean_y - beta * mean_x
+        x_mean = np.nanmean(x) + mean_x
+        beta_scores = Xc * residuals / cxx
+        alpha_scores = (mask / n - x_mean * Xc / cxx) * residuals
+
+        return (np.sqrt(_long_run_variance(beta_scores, lags)),
+                np.sqrt(_long_run_variance(alpha_scores, lags)), stocks)
+
+
+## Standard errors and confidence intervals of beta and alpha, one row per stock
+
+def beta_uncertainty(returns, market = reg.MARKET, resamples = RESAMPLES, confidence = CONFIDENCE,
+                     block_length = None, seed = 0, processes = PROCESSES):
+    beta_hac, alpha_hac, stocks = hac_errors(returns, market)
+    betas, alphas = bootstrap(returns, market, resamples, block_length, seed, processes)
+    tails = [(1 - confidence) / 2 * 100, (1 + confidence) / 2 * 100]
+
+    ## Stocks without enough data give all-NaN columns
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        beta_low, beta_high = np.nanpercentile(betas, tails, axis = 0)
+        alpha_low, alpha_high = np.nanpercentile(alphas, tails, axis = 0)
+        beta_se, alpha_se = np.nanstd(betas, axis = 0, ddof = 1), np.nanstd(alphas, axis = 0, ddof = 1)
+
+    return pd.DataFrame({
+        'beta_se_hac': beta_hac,
+        'beta_se_bootstrap': beta_se,
+        'beta_ci_low': beta_low,
+        'beta_ci_high': beta_high,
+        'alpha_se_hac': alpha_hac,
+        'alpha_se_bootstrap': alpha_se,
+        'alpha_ci_low': alpha_low,
+        'alpha_ci_high': alpha_high,
+    }, index = pd.Index(stocks, name = 'Stock'))